@@ -0,0 +1,266 @@
+"""Ridership analytics over the transactions table.
+
+Fare debits are streamed out of MySQL one day at a time, in chunks, into NumPy
+arrays and aggregated with bincount into dense (bus x hour) and (stop x hour)
+boarding counts plus revenue per bus. Each closed day is computed once and stored
+as a small JSON file, so later reports only add up saved days and re-read today.
+Days that can still change (today, plus the last `open_days` days that offline
+scanner uploads may add taps to) are never saved and are recomputed after a short
+TTL instead. Days whose rows have been archived out of MySQL (before `live_since()`)
+are never computed, so an archived month can't be saved as zeros. Reports are cached
+in memory as ready-to-send JSON, up to `max_reports` of them.
+
+app.py creates the RidershipAnalytics instance lazily (NumPy is only imported when
+a staff member asks for analytics) and reads through mysql.read_connection, so a
+configured replica takes this load instead of the primary.
+"""
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+HOURS = 24
+
+def grow_rows(array, rows):
+    """Pad a 2-D array with zero rows up to `rows`"""
+    if array.shape[0] >= rows:
+        return array
+    return np.vstack([array, np.zeros((rows - array.shape[0], array.shape[1]), dtype=array.dtype)])
+
+def grow(array, size):
+    """Pad a 1-D array with zeros up to `size`"""
+    if array.shape[0] >= size:
+        return array
+    return np.concatenate([array, np.zeros(size - array.shape[0], dtype=array.dtype)])
+
+class DailyRidership:
+    """Boardings and revenue for one day, indexed by bus/stop and hour of day"""
+    def __init__(self, day, buses, stops, bus_hour, stop_hour, revenue):
+        self.day = day
+        self.buses = buses
+        self.stops = stops
+        self.bus_hour = bus_hour
+        self.stop_hour = stop_hour
+        self.revenue = revenue
+
+    def to_json(self):
+        return {
+            'day': self.day.isoformat(),
+            'buses': self.buses,
+            'stops': self.stops,
+            'bus_hour': self.bus_hour.tolist(),
+            'stop_hour': self.stop_hour.tolist(),
+            'revenue': self.revenue.tolist()
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            date.fromisoformat(data['day']),
+            data['buses'],
+            data['stops'],
+            np.array(data['bus_hour'], dtype=np.int64).reshape(-1, HOURS),
+            np.array(data['stop_hour'], dtype=np.int64).reshape(-1, HOURS),
+            np.array(data['revenue'], dtype=np.float64)
+        )
+
+def compute_day(cursor_factory, day, chunk_size=10000):
+    """Aggregate one day of fare debits, streaming rows in chunks"""
+    bus_index = {}
+    stop_index = {}
+    bus_hour = np.zeros((0, HOURS), dtype=np.int64)
+    stop_hour = np.zeros((0, HOURS), dtype=np.int64)
+    revenue = np.zeros(0, dtype=np.float64)
+
+    cur = cursor_factory()
+    try:
+        cur.execute('''
+            SELECT bus_number, location, HOUR(created_at), amount
+            FROM transactions
+            WHERE transaction_type = 'debit' AND created_at >= %s AND created_at < %s
+        ''', (day, day + timedelta(days=1)))
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            count = len(rows)
+            # Labels become small integer ids; everything after this is vectorized
+            bus_ids = np.fromiter((bus_index.setdefault(r[0] or 'Unknown', len(bus_index)) for r in rows),
+                                  dtype=np.int64, count=count)
+            stop_ids = np.fromiter((stop_index.setdefault(r[1] or 'Unknown', len(stop_index)) for r in rows),
+                                   dtype=np.int64, count=count)
+            hours = np.fromiter((r[2] for r in rows), dtype=np.int64, count=count)
+            amounts = np.fromiter((float(r[3]) for r in rows), dtype=np.float64, count=count)
+
+            n_buses, n_stops = len(bus_index), len(stop_index)
+            bus_hour = grow_rows(bus_hour, n_buses) + np.bincount(
+                bus_ids * HOURS + hours, minlength=n_buses * HOURS).reshape(n_buses, HOURS)
+            stop_hour = grow_rows(stop_hour, n_stops) + np.bincount(
+                stop_ids * HOURS + hours, minlength=n_stops * HOURS).reshape(n_stops, HOURS)
+            revenue = grow(revenue, n_buses) + np.bincount(bus_ids, weights=amounts, minlength=n_buses)
+    finally:
+        cur.close()
+
+    return DailyRidership(day, list(bus_index), list(stop_index), bus_hour, stop_hour, revenue)
+
+def combine(days, labels_attr, matrix_attr):
+    """Sum per-day matrices whose row labels may differ from day to day"""
+    labels = sorted({label for d in days for label in getattr(d, labels_attr)})
+    position = {label: i for i, label in enumerate(labels)}
+    width = getattr(days[0], matrix_attr).shape[1] if days and getattr(days[0], matrix_attr).ndim == 2 else None
+    total = np.zeros((len(labels), width) if width else len(labels), dtype=np.float64)
+    for d in days:
+        rows = np.array([position[label] for label in getattr(d, labels_attr)], dtype=np.int64)
+        if rows.size:
+            np.add.at(total, rows, getattr(d, matrix_attr))
+    return labels, total
+
+class RidershipAnalytics:
+    """Incrementally maintained ridership aggregates with cached JSON reports"""
+    def __init__(self, cursor_factory, cache_dir, chunk_size=10000, today_ttl=60, open_days=0,
+                 live_since=None, max_reports=128):
+        self.cursor_factory = cursor_factory
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.today_ttl = today_ttl
+        self.open_days = open_days
+        # Returns the first day whose rows are still in MySQL (None if nothing is archived)
+        self.live_since = live_since or (lambda: None)
+        self.max_reports = max_reports
+        self._open = {}  # day -> (computed_at, DailyRidership) for days that can still change
+        self._reports = {}  # (start, end) -> (expires_at, json text)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, day):
+        return os.path.join(self.cache_dir, f"{day.isoformat()}.json")
+
+    def first_closed_day(self):
+        """Days before this one no longer change and are saved"""
+        return date.today() - timedelta(days=self.open_days)
+
+    def daily(self, day, save=None, live_since=None):
+        """Aggregates for one day: saved file for closed days, short-lived cache for open ones.
+
+        A closed day with no saved file that is before ``live_since`` has been archived:
+        it is returned empty and not saved.
+        """
+        if save is None:
+            save = day < self.first_closed_day()
+        if not save:
+            with self._lock:
+                cached = self._open.get(day)
+                if cached and time.monotonic() - cached[0] < self.today_ttl:
+                    return cached[1]
+            result = compute_day(self.cursor_factory, day, self.chunk_size)
+            with self._lock:
+                self._open = {d: c for d, c in self._open.items() if d >= self.first_closed_day()}
+                self._open[day] = (time.monotonic(), result)
+            return result
+
+        path = self._path(day)
+        if os.path.exists(path):
+            with open(path) as f:
+                return DailyRidership.from_json(json.load(f))
+        if live_since is None:
+            live_since = self.live_since()
+        if live_since and day < live_since:
+            return DailyRidership(day, [], [], np.zeros((0, HOURS), dtype=np.int64),
+                                  np.zeros((0, HOURS), dtype=np.int64), np.zeros(0, dtype=np.float64))
+        result = compute_day(self.cursor_factory, day, self.chunk_size)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(result.to_json(), f)
+        os.replace(tmp, path)
+        return result
+
+    def update(self, since, until=None, final=False):
+        """Compute and save any missing closed days in [since, until]; returns days computed.
+
+        Days that late taps may still change are skipped unless ``final`` is set (the
+        archive job passes it when the rows are about to leave the database).
+        """
+        until = min(until or date.today(), date.today() - timedelta(days=1))
+        if not final:
+            until = min(until, self.first_closed_day() - timedelta(days=1))
+        live_since = self.live_since()
+        if live_since:
+            since = max(since, live_since)
+        computed = 0
+        day = since
+        while day <= until:
+            if not os.path.exists(self._path(day)):
+                self.daily(day, save=True)
+                computed += 1
+            day += timedelta(days=1)
+        return computed
+
+    def report_json(self, start, end, routes=None):
+        """JSON report for [start, end]; cached until today's numbers go stale"""
+        key = (start, end)
+        with self._lock:
+            cached = self._reports.get(key)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+
+        live_since = self.live_since() or date.min  # looked up once, not per missing day
+        days = []
+        day = start
+        while day <= end:
+            days.append(self.daily(day, live_since=live_since))
+            day += timedelta(days=1)
+        text = json.dumps(self.build_report(start, end, days, routes or {}))
+
+        ttl = self.today_ttl if end >= self.first_closed_day() else 24 * 3600
+        with self._lock:
+            now = time.monotonic()
+            self._reports = {k: v for k, v in self._reports.items() if v[0] > now and k != key}
+            while len(self._reports) >= self.max_reports:
+                del self._reports[next(iter(self._reports))]  # oldest first
+            self._reports[key] = (now + ttl, text)
+        return text
+
+    @staticmethod
+    def build_report(start, end, days, routes):
+        n_days = max(1, len(days))
+        buses, bus_hour = combine(days, 'buses', 'bus_hour')
+        _, revenue = combine(days, 'buses', 'revenue')
+        stops, stop_hour = combine(days, 'stops', 'stop_hour')
+
+        bus_report = {}
+        for i, bus in enumerate(buses):
+            hourly = bus_hour[i]
+            peak_hour = int(hourly.argmax()) if hourly.any() else None
+            bus_report[bus] = {
+                'route': routes.get(bus),
+                'boardings': int(hourly.sum()),
+                'revenue': round(float(revenue[i]), 2),
+                'hourly_boardings': hourly.astype(int).tolist(),
+                'peak_load_curve': np.round(hourly / n_days, 2).tolist(),
+                'peak_hour': peak_hour,
+                'peak_hour_avg_boardings': round(float(hourly[peak_hour]) / n_days, 2) if peak_hour is not None else 0
+            }
+
+        route_revenue = {}
+        for bus, data in bus_report.items():
+            route = data['route'] or f"Bus {bus}"
+            route_revenue[route] = round(route_revenue.get(route, 0) + data['revenue'], 2)
+
+        return {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'days': len(days),
+            'total_boardings': int(bus_hour.sum()),
+            'total_revenue': round(float(revenue.sum()), 2),
+            'hourly_boardings': bus_hour.sum(axis=0).astype(int).tolist() if len(buses) else [0] * HOURS,
+            'buses': bus_report,
+            'stops': {
+                stop: {'boardings': int(stop_hour[i].sum()), 'hourly_boardings': stop_hour[i].astype(int).tolist()}
+                for i, stop in enumerate(stops)
+            },
+            'revenue_by_route': route_revenue,
+            'generated_at': datetime.now().isoformat(timespec='seconds')
+        }
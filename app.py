@@ -1,35 +1,180 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file
+import time
+_startup_started = time.perf_counter()
+_startup_stages = []
+_startup_last_mark = _startup_started
+
+def mark_startup(stage):
+    """Record how long the module-level stage that just finished took (see /startup-report)"""
+    global _startup_last_mark
+    now = time.perf_counter()
+    _startup_stages.append({'stage': stage, 'ms': round((now - _startup_last_mark) * 1000, 2)})
+    _startup_last_mark = now
+
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file, send_from_directory, has_request_context, g
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
 from werkzeug.security import generate_password_hash, check_password_hash
 import os
-from datetime import datetime
-import qrcode
+import sys
+import math
+import gzip
+import shutil
+import click
+import mimetypes
+import atexit
+import secrets
+import random
+import hmac
+import itertools
+import hashlib
+import base64
+import zlib
+import tempfile
+import queue
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
 from io import BytesIO
 import json
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+mark_startup('import flask/stdlib')
+# qrcode (and PIL through it) is imported inside generate_qr - most cold starts never need it
 import pymysql
-from pymysql import IntegrityError, Error as PyMySQLError
+import pymysql.cursors
+from pymysql import DataError, IntegrityError, Error as PyMySQLError
+mark_startup('import pymysql')
 
 # Load environment variables from .env file (only for local development)
 # On Vercel/Render, environment variables are set in the dashboard
-try:
-    from dotenv import load_dotenv
-    load_dotenv()  # This will silently fail if .env doesn't exist (which is fine for Vercel)
-except ImportError:
-    pass  # python-dotenv not available, use system environment variables
+if not os.getenv('VERCEL'):
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()  # This will silently fail if .env doesn't exist
+    except ImportError:
+        pass  # python-dotenv not available, use system environment variables
+mark_startup('load dotenv')
 
 app = Flask(__name__)
 # Secret key is required for sessions - use a default if not set (not secure for production!)
 app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
 
+# Cache compiled templates on disk so new workers skip the Jinja compile step
+# (/tmp is the only writable path on Vercel)
+_template_cache_dir = os.getenv('TEMPLATE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'bus-management-jinja'))
+try:
+    os.makedirs(_template_cache_dir, exist_ok=True)
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(_template_cache_dir))
+except OSError as e:
+    print(f"Warning: template bytecode cache disabled: {str(e)}")
+
+mark_startup('create app')
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of connecting while the database circuit breaker is open"""
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker around database connection attempts.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and callers
+    fail immediately. Once ``reset_timeout`` has passed one caller is let through as
+    a half-open probe; if it fails the timeout doubles, up to ``max_reset_timeout``.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=5.0, max_reset_timeout=60.0, name='Database'):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        """True while calls would be rejected (open and not yet due for a probe)"""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self):
+        """Raise CircuitOpenError unless a connection attempt may go ahead"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(f"{self.name} temporarily unavailable (circuit open, retry in {retry_in:.0f}s)")
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if self.state == self.HALF_OPEN:
+                # Probe failed - back off before the next one
+                self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            elif self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"{self.name} circuit breaker opened after {self.failures} failures: {self.last_error}")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def status(self):
+        with self._lock:
+            status = {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'last_error': self.last_error
+            }
+            if self.opened_at is not None:
+                status['retry_in_s'] = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+            return status
+
+db_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('DB_BREAKER_FAILURES', 3)),
+    reset_timeout=float(os.getenv('DB_BREAKER_RESET', 5)),
+    max_reset_timeout=float(os.getenv('DB_BREAKER_MAX_RESET', 60))
+)
+
 # MySQL Configuration using PyMySQL
 class MySQL:
     """Custom MySQL wrapper using PyMySQL to replace Flask-MySQLdb"""
-    def __init__(self, app=None):
+    def __init__(self, app=None, breaker=None, **overrides):
         self.app = app
+        # Replicas pass their own breaker and host/port so they never trip the primary's
+        self.breaker = breaker or db_breaker
+        self.overrides = overrides
+        # One connection per thread so threaded/ASGI servers never share a PyMySQL connection
+        self._local = threading.local()
         self._connection = None
         self.config = {}
         if app is not None:
             self.init_app(app)
     
+    @property
+    def _connection(self):
+        return getattr(self._local, 'connection', None)
+    
+    @_connection.setter
+    def _connection(self, value):
+        self._local.connection = value
+    
     def init_app(self, app):
         self.app = app
         self.config = {
@@ -40,11 +185,13 @@ class MySQL:
             'port': app.config.get('MYSQL_PORT', 3306),
             'charset': 'utf8mb4',
             'autocommit': False,
-            'connect_timeout': 10
+            'connect_timeout': app.config.get('MYSQL_CONNECT_TIMEOUT', 10)
         }
+        self.config.update(self.overrides)
     
     def connect(self):
         """Create a new database connection"""
+        self.breaker.allow()
         try:
             # Check if we're in production and database config is missing
             is_production = os.getenv('RENDER') or os.getenv('VERCEL') or not os.getenv('FLASK_ENV') == 'development'
@@ -55,8 +202,10 @@ class MySQL:
                 )
             
             self._connection = pymysql.connect(**self.config)
+            self.breaker.record_success()
             print(f"Successfully connected to MySQL at {self.config.get('host')}:{self.config.get('port')}")
         except pymysql.Error as e:
+            self.breaker.record_failure(e)
             error_msg = str(e)
             print(f"MySQL connection error: {error_msg}")
             # Provide helpful error messages
@@ -92,6 +241,9 @@ class MySQL:
                     # Connection lost, reconnect
                     self._connection = None
                     self.connect()
+        except CircuitOpenError:
+            # Fail fast - don't retry while the database is known to be down
+            raise
         except Exception as e:
             # Connection lost, reconnect
             print(f"Connection error, reconnecting: {str(e)}")
@@ -133,6 +285,7 @@ app.config['MYSQL_USER'] = os.getenv('MYSQL_USER') or os.getenv('DB_USER') or 'r
 app.config['MYSQL_PASSWORD'] = os.getenv('MYSQL_PASSWORD') or os.getenv('DB_PASSWORD') or '1239'
 app.config['MYSQL_DB'] = os.getenv('MYSQL_DB') or os.getenv('DB_NAME') or 'bus_management'
 app.config['MYSQL_PORT'] = int(os.getenv('MYSQL_PORT') or os.getenv('DB_PORT') or 3306)
+app.config['MYSQL_CONNECT_TIMEOUT'] = int(os.getenv('MYSQL_CONNECT_TIMEOUT', 10))
 
 mysql = MySQL(app)
 
@@ -142,11 +295,11 @@ class ConnectionWrapper:
     def __init__(self, mysql_instance):
         self.mysql = mysql_instance
     
-    def cursor(self):
+    def cursor(self, cursor_class=None):
         """Get a cursor from the connection"""
         try:
             conn = self.mysql.get_connection()
-            return conn.cursor()
+            return conn.cursor(cursor_class)
         except Exception as e:
             print(f"Error getting cursor: {str(e)}")
             raise
@@ -162,26 +315,324 @@ class ConnectionWrapper:
 # Replace mysql.connection with wrapper
 mysql.connection = ConnectionWrapper(mysql)
 
+# Read replicas
+# Read-only pages can be served from replicas listed in MYSQL_REPLICAS (host[:port],
+# comma-separated; same user/password/database as the primary). Writes and anything
+# inside a transaction stay on mysql.connection. After a user's own write their reads
+# are pinned to the primary for READ_YOUR_WRITES_WINDOW seconds.
+app.config['MYSQL_REPLICAS'] = [h.strip() for h in os.getenv('MYSQL_REPLICAS', '').split(',') if h.strip()]
+app.config['MYSQL_REPLICA_MAX_LAG'] = float(os.getenv('MYSQL_REPLICA_MAX_LAG', 5))
+app.config['MYSQL_REPLICA_CHECK_INTERVAL'] = float(os.getenv('MYSQL_REPLICA_CHECK_INTERVAL', 10))
+app.config['READ_YOUR_WRITES_WINDOW'] = float(os.getenv('READ_YOUR_WRITES_WINDOW', 5))
+
+class Replica:
+    """One read replica with its own connections, breaker and lag-based health"""
+    def __init__(self, app, address):
+        host, _, port = address.partition(':')
+        self.name = address
+        self.max_lag = app.config['MYSQL_REPLICA_MAX_LAG']
+        self.check_interval = app.config['MYSQL_REPLICA_CHECK_INTERVAL']
+        # autocommit so a long-lived connection never keeps reading from an old snapshot
+        self.db = MySQL(app, breaker=CircuitBreaker(failure_threshold=1, name=f'Replica {address}'), host=host,
+                        port=int(port or app.config['MYSQL_PORT']), autocommit=True)
+        self.healthy = True
+        self.lag = None
+        self.error = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+        self._monitor = None
+
+    # MySQL error for a missing privilege; SHOW REPLICA STATUS needs REPLICATION CLIENT
+    ACCESS_DENIED = 1227
+
+    def is_available(self):
+        """Last known health; the lag check itself runs on a monitor thread, never a request thread"""
+        self.start_monitor()
+        return self.healthy
+
+    def start_monitor(self):
+        with self._lock:
+            if self._monitor is None or not self._monitor.is_alive():
+                self._monitor = threading.Thread(target=self._monitor_loop, name=f'replica-monitor-{self.name}', daemon=True)
+                self._monitor.start()
+
+    def _monitor_loop(self):
+        while True:
+            self.check()
+            time.sleep(self.check_interval)
+
+    def check(self):
+        """Measure replication lag; eject the replica if it is too far behind or unreachable"""
+        self.checked_at = time.monotonic()
+        cur = None
+        try:
+            cur = self.db.get_connection().cursor()
+            try:
+                cur.execute('SHOW REPLICA STATUS')
+            except PyMySQLError:
+                cur.execute('SHOW SLAVE STATUS')  # MySQL < 8.0.22
+            row = cur.fetchone()
+            if row is None:
+                # Not configured as a replica (e.g. a standalone local stand-in) - no lag to measure
+                lag = 0
+            else:
+                columns = [d[0] for d in cur.description]
+                column = 'Seconds_Behind_Source' if 'Seconds_Behind_Source' in columns else 'Seconds_Behind_Master'
+                lag = row[columns.index(column)]
+            self.lag = lag
+            if lag is None or lag > self.max_lag:
+                self.mark_unhealthy('replication stopped' if lag is None else f'lag {lag}s exceeds {self.max_lag}s')
+            else:
+                if not self.healthy:
+                    print(f"Replica {self.name} is healthy again (lag {lag}s)")
+                self.healthy = True
+                self.error = None
+        except PyMySQLError as e:
+            if e.args and e.args[0] == self.ACCESS_DENIED:
+                # Reachable, but lag can't be read - keep serving rather than eject it forever
+                reason = 'lag unknown: grant REPLICATION CLIENT to the app user to monitor replication lag'
+                if self.error != reason:
+                    print(f"Warning: replica {self.name} {reason}")
+                self.lag = None
+                self.healthy = True
+                self.error = reason
+            else:
+                self.mark_unhealthy(str(e))
+        except Exception as e:
+            self.mark_unhealthy(str(e))
+        finally:
+            if cur:
+                cur.close()
+
+    def mark_unhealthy(self, reason):
+        if self.healthy:
+            print(f"Ejecting replica {self.name}: {reason}")
+        self.healthy = False
+        self.error = reason
+        self.checked_at = time.monotonic()
+
+    def status(self):
+        return {'replica': self.name, 'healthy': self.healthy, 'lag_s': self.lag, 'error': self.error}
+
+def mark_user_write():
+    """Pin this user's reads to the primary for a few seconds after they write"""
+    session['_primary_until'] = time.time() + app.config['READ_YOUR_WRITES_WINDOW']
+
+class ReadConnectionWrapper:
+    """Like mysql.connection, but cursor() may come from a healthy replica"""
+    def __init__(self, primary, replicas):
+        self.primary = primary
+        self.replicas = replicas
+        self._counter = itertools.count()  # next() is atomic, unlike += across pool threads
+
+    def pick(self):
+        """Return a replica to read from, or None to use the primary"""
+        if not self.replicas:
+            return None
+        if has_request_context() and session.get('_primary_until', 0) > time.time():
+            return None
+        available = [r for r in self.replicas if r.is_available()]
+        if not available:
+            return None
+        return available[next(self._counter) % len(available)]
+
+    def cursor(self, cursor_class=None):
+        replica = self.pick()
+        if replica is not None:
+            try:
+                return replica.db.get_connection().cursor(cursor_class)
+            except Exception as e:
+                replica.mark_unhealthy(str(e))
+        return self.primary.cursor(cursor_class)
+
+replicas = [Replica(app, address) for address in app.config['MYSQL_REPLICAS']]
+mysql.read_connection = ReadConnectionWrapper(mysql.connection, replicas)
+
+def request_cursor(read=False):
+    """This request's cursor on the primary (or on read_connection), reused until teardown"""
+    key = 'read_cursor' if read else 'cursor'
+    cur = g.get(key)
+    if cur is None:
+        cur = (mysql.read_connection if read else mysql.connection).cursor()
+        setattr(g, key, cur)
+    return cur
+
+@app.teardown_request
+def close_request_cursors(error=None):
+    for key in ('cursor', 'read_cursor'):
+        cur = g.pop(key, None)
+        if cur is not None:
+            try:
+                cur.close()
+            except Exception as e:
+                print(f"Error closing cursor: {str(e)}")
+
+# Row models
+# One namedtuple per query shape, carrying the column list it is selected with, so a
+# route fetches only the columns it uses and reads them by name. Namedtuples are
+# slotted, so rows cost no per-row dict. Queries use {columns} for the select list.
+def row_model(name, columns):
+    """namedtuple named after the columns (table prefix / alias stripped); .columns is the select list"""
+    model = namedtuple(name, [column.split()[-1].split('.')[-1] for column in columns])
+    model.columns = ', '.join(columns)
+    return model
+
+def fetch_one(cur, model, query, params=()):
+    cur.execute(query.format(columns=model.columns), params)
+    row = cur.fetchone()
+    return model._make(row) if row else None
+
+def fetch_all(cur, model, query, params=()):
+    cur.execute(query.format(columns=model.columns), params)
+    return list(map(model._make, cur.fetchall()))
+
+LoginUser = row_model('LoginUser', ['id', 'usn', 'name', 'password', 'bus_number'])
+UserListing = row_model('UserListing', ['id', 'usn', 'name', 'phone', 'email', 'bus_number', 'balance'])
+DashboardUser = row_model('DashboardUser', [
+    'u.id', 'u.usn', 'u.name', 'u.phone', 'u.email', 'u.bus_number', 'u.address', 'u.balance',
+    's.month_key', 's.trips_this_month', 's.spend_this_month', 's.last_trip_at', 's.last_trip_bus', 's.last_trip_location'
+])
+BusListing = row_model('BusListing', ['bus_number', 'starting_point', 'ending_point', 'total_seats', 'available_seats', 'fare'])
+AvailableBus = row_model('AvailableBus', [
+    'b.bus_number', 'b.starting_point', 'b.ending_point', 't.total_seats', 't.available_seats AS seats_left', 'b.fare'
+])
+TripBus = row_model('TripBus', [
+    'b.bus_number', 'b.starting_point', 'b.ending_point', 't.total_seats', 't.available_seats', 'b.fare', 't.id AS trip_id'
+])
+UserTransaction = row_model('UserTransaction', ['id', 'amount', 'transaction_type', 'description', 'bus_number', 'location', 'created_at'])
+ArchivedMonth = row_model('ArchivedMonth', ['month', 'credit_count + debit_count AS count', 'credit_total', 'debit_total'])
+TransactionListing = row_model('TransactionListing', [
+    'id', 'user_id', 'amount', 'transaction_type', 'description', 'bus_number', 'location', 'created_at'
+])
+BusSettlement = row_model('BusSettlement', [
+    'settle_date', 'bus_number', 'debit_count', 'debit_total', 'credit_count', 'credit_total', 'riders'
+])
+WalletMismatch = row_model('WalletMismatch', ['m.user_id', 'u.usn', 'm.balance', 'm.expected', 'm.detected_at'])
+mark_startup('database wrapper')
+
 # Create required tables if they don't exist
 def init_db():
     with app.app_context():
         cur = mysql.connection.cursor()
         try:
-            # Drop existing transactions table if it exists
-            cur.execute('DROP TABLE IF EXISTS transactions')
-            
-            # Create transactions table
+            # Create transactions table, range-partitioned by month on created_at.
+            # Partitioned InnoDB tables can't have foreign keys, so user_id is only indexed.
+            # Monthly partitions are added by ensure_transaction_partitions() below;
+            # `flask partition-transactions` converts an existing unpartitioned table.
             cur.execute('''
-                CREATE TABLE transactions (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
+                CREATE TABLE IF NOT EXISTS transactions (
+                    id INT AUTO_INCREMENT,
                     user_id INT NOT NULL,
                     amount DECIMAL(10,2) NOT NULL,
                     transaction_type ENUM('credit', 'debit') NOT NULL,
                     description VARCHAR(255),
                     bus_number VARCHAR(20),
                     location VARCHAR(100),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES user(id)
+                    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    inserted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (id, created_at),
+                    KEY user_created (user_id, created_at)
+                )
+                PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (
+                    PARTITION pmax VALUES LESS THAN MAXVALUE
+                )
+            ''')
+            ensure_transaction_partitions(cur)
+            # created_at can be backdated (offline taps); settlement needs the real insert time
+            ensure_column(cur, 'transactions', 'inserted_at', 'TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP')
+
+            # Seat inventory per trip (bus x date x departure), generated ahead by generate_trips()
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS trip (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    bus_number VARCHAR(20) NOT NULL,
+                    trip_date DATE NOT NULL,
+                    departure TIME NOT NULL,
+                    total_seats INT NOT NULL,
+                    available_seats INT NOT NULL,
+                    UNIQUE KEY trip_slot (trip_date, departure, bus_number)
+                )
+            ''')
+
+            # Archived months and the per-user totals kept behind for them
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS transaction_archive (
+                    month CHAR(7) PRIMARY KEY,
+                    path VARCHAR(255) NOT NULL,
+                    row_count INT NOT NULL,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS transaction_archive_summary (
+                    user_id INT NOT NULL,
+                    month CHAR(7) NOT NULL,
+                    credit_count INT NOT NULL DEFAULT 0,
+                    credit_total DECIMAL(12,2) NOT NULL DEFAULT 0,
+                    debit_count INT NOT NULL DEFAULT 0,
+                    debit_total DECIMAL(12,2) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, month)
+                )
+            ''')
+
+            # Fare settlement: per-bus daily totals, the riders behind them and a running
+            # per-user ledger, all filled in by settle_transactions() up to the watermark
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS bus_settlement (
+                    settle_date DATE NOT NULL,
+                    bus_number VARCHAR(20) NOT NULL,
+                    debit_count INT NOT NULL DEFAULT 0,
+                    debit_total DECIMAL(12,2) NOT NULL DEFAULT 0,
+                    credit_count INT NOT NULL DEFAULT 0,
+                    credit_total DECIMAL(12,2) NOT NULL DEFAULT 0,
+                    riders INT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    PRIMARY KEY (settle_date, bus_number)
+                )
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS settlement_rider (
+                    settle_date DATE NOT NULL,
+                    bus_number VARCHAR(20) NOT NULL,
+                    user_id INT NOT NULL,
+                    PRIMARY KEY (settle_date, bus_number, user_id)
+                )
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS wallet_ledger (
+                    user_id INT PRIMARY KEY,
+                    credit_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+                    debit_total DECIMAL(14,2) NOT NULL DEFAULT 0
+                )
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS wallet_mismatch (
+                    user_id INT PRIMARY KEY,
+                    balance DECIMAL(10,2),
+                    expected DECIMAL(14,2) NOT NULL,
+                    detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS settlement_watermark (
+                    source VARCHAR(32) PRIMARY KEY,
+                    last_id BIGINT NOT NULL DEFAULT 0,
+                    settled_at TIMESTAMP NULL
+                )
+            ''')
+
+            # Taps validated offline by bus scanners; tap_id makes re-uploads idempotent
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS offline_tap (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    tap_id VARCHAR(64) NOT NULL,
+                    bus_number VARCHAR(20) NOT NULL,
+                    user_id INT NOT NULL,
+                    tapped_at TIMESTAMP NOT NULL,
+                    snapshot_version CHAR(16),
+                    charged DECIMAL(10,2) NOT NULL,
+                    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE KEY bus_tap (bus_number, tap_id)
                 )
             ''')
 
@@ -197,6 +648,52 @@ def init_db():
                     FOREIGN KEY (user_id) REFERENCES user(id)
                 )
             ''')
+
+            # Create per-user dashboard summary table (maintained incrementally by scan_qr/topup)
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS user_summary (
+                    user_id INT PRIMARY KEY,
+                    month_key CHAR(7) NOT NULL,
+                    trips_this_month INT NOT NULL DEFAULT 0,
+                    spend_this_month DECIMAL(10,2) NOT NULL DEFAULT 0,
+                    last_trip_at TIMESTAMP NULL,
+                    last_trip_bus VARCHAR(20),
+                    last_trip_location VARCHAR(100),
+                    balance DECIMAL(10,2) NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE
+                )
+            ''')
+
+            # Create feedback rating rollups (per feedback type and per bus)
+            cur.execute('''
+                CREATE TABLE IF NOT EXISTS feedback_rollup (
+                    scope ENUM('type', 'bus') NOT NULL,
+                    scope_key VARCHAR(20) NOT NULL,
+                    rating_count INT NOT NULL DEFAULT 0,
+                    rating_sum INT NOT NULL DEFAULT 0,
+                    r1 INT NOT NULL DEFAULT 0,
+                    r2 INT NOT NULL DEFAULT 0,
+                    r3 INT NOT NULL DEFAULT 0,
+                    r4 INT NOT NULL DEFAULT 0,
+                    r5 INT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (scope, scope_key)
+                )
+            ''')
+            # Seed type rollups from existing feedback the first time (no-op once rows exist)
+            cur.execute('''
+                INSERT IGNORE INTO feedback_rollup
+                    (scope, scope_key, rating_count, rating_sum, r1, r2, r3, r4, r5)
+                SELECT 'type', feedback_type, COUNT(*), SUM(rating),
+                       SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+                FROM feedback
+                WHERE NOT EXISTS (SELECT 1 FROM feedback_rollup)
+                GROUP BY feedback_type
+            ''')
+
+            # Indexes behind the admin browser's prefix search and sorting
+            ensure_index(cur, 'user', 'user_name', 'name')
+            ensure_index(cur, 'user', 'user_email', 'email')
             mysql.connection.commit()
             print("Database tables initialized successfully")
         except Exception as e:
@@ -220,6 +717,151 @@ def ensure_db_initialized():
             print(f"Warning: Database initialization failed: {str(e)}")
             # Don't fail the app if DB init fails - tables might already exist
 
+_first_request_ms = None
+
+# Endpoints that never touch the database
+NO_DB_ENDPOINTS = {'static', 'generate_qr', 'startup_report', 'healthz', 'readyz', 'index', 'view_bus_location', 'view_qr_code', 'qr_scan', 'logout', 'db_config', 'list_profiles', 'download_profile'}
+
+def degraded_response():
+    """Served instead of a database-backed page while the circuit breaker is open"""
+    status = db_breaker.status()
+    retry_after = str(max(1, math.ceil(status.get('retry_in_s', 5))))
+    if request.is_json or request.endpoint == 'scan_qr':
+        return jsonify({'success': False, 'message': 'Service temporarily unavailable. Please try again shortly.'}), 503, {'Retry-After': retry_after}
+    return render_template('503.html'), 503, {'Retry-After': retry_after}
+
+# Request profiling
+# Opt-in sampling profiler: staff can profile one request with an `X-Profile: 1` header
+# or `?_profile=1`, and PROFILE_SAMPLE_RATE profiles that fraction of all requests. A
+# helper thread samples the request thread's stack every PROFILE_INTERVAL_MS, so only
+# profiled requests pay anything. Each sample is filed under sql (inside PyMySQL),
+# template (inside Jinja) or python, and stacks are saved in collapsed format
+# (flamegraph.pl / speedscope) to PROFILE_DIR, keeping the newest PROFILE_KEEP.
+app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_INTERVAL_MS'] = float(os.getenv('PROFILE_INTERVAL_MS', 2))
+app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'bus-management-profiles'))
+app.config['PROFILE_KEEP'] = int(os.getenv('PROFILE_KEEP', 50))
+
+PROFILE_CATEGORIES = ('sql', 'template', 'python')
+_profile_lock = threading.Lock()
+
+class RequestSampler:
+    """Samples one thread's Python stack at a fixed interval from a helper thread"""
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}  # collapsed stack -> sample count
+        self.categories = dict.fromkeys(PROFILE_CATEGORIES, 0)
+        self.wall_ms = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._started = time.perf_counter()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.wall_ms = (time.perf_counter() - self._started) * 1000
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.record(frame)
+
+    def record(self, frame):
+        names = []
+        category = 'python'
+        while frame is not None:
+            code = frame.f_code
+            filename = code.co_filename
+            if f"{os.sep}pymysql{os.sep}" in filename:
+                category = 'sql'
+            elif category != 'sql' and (filename.endswith('.html') or f"{os.sep}jinja2{os.sep}" in filename):
+                category = 'template'
+            names.append(f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(filename)})")
+            if code.co_name == 'wsgi_app':
+                # Everything below Flask's entry point is server plumbing
+                break
+            frame = frame.f_back
+        names.append(category)
+        stack = ';'.join(reversed(names))
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.categories[category] += 1
+
+    def breakdown(self):
+        total = sum(self.categories.values())
+        return {
+            category: {'samples': n, 'ms': round(self.wall_ms * n / total, 1) if total else 0.0}
+            for category, n in self.categories.items()
+        }
+
+def should_profile():
+    if request.endpoint in ('static', 'list_profiles', 'download_profile'):
+        return False
+    if request.headers.get('X-Profile') == '1' or request.args.get('_profile') == '1':
+        return is_staff()
+    rate = app.config['PROFILE_SAMPLE_RATE']
+    return rate > 0 and random.random() < rate
+
+def save_profile(name, sampler, meta):
+    """Write <name>.folded and <name>.json, then drop the oldest profiles beyond PROFILE_KEEP"""
+    directory = app.config['PROFILE_DIR']
+    with _profile_lock:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, name + '.folded'), 'w') as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in sorted(sampler.stacks.items()))
+        with open(os.path.join(directory, name + '.json'), 'w') as f:
+            json.dump(meta, f)
+        saved = sorted(n[:-len('.json')] for n in os.listdir(directory) if n.endswith('.json'))
+        for old in saved[:max(0, len(saved) - app.config['PROFILE_KEEP'])]:
+            for ext in ('.folded', '.json'):
+                try:
+                    os.remove(os.path.join(directory, old + ext))
+                except FileNotFoundError:
+                    pass
+
+@app.before_request
+def start_profiling():
+    if should_profile():
+        g.profile_name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{request.endpoint or 'unknown'}-{secrets.token_hex(3)}"
+        g.profiler = RequestSampler(threading.get_ident(), app.config['PROFILE_INTERVAL_MS'] / 1000).start()
+
+@app.after_request
+def tag_profiled_response(response):
+    if 'profiler' in g:
+        g.profile_status = response.status_code
+        response.headers['X-Profile-Id'] = g.profile_name
+    return response
+
+@app.teardown_request
+def finish_profiling(error=None):
+    sampler = g.pop('profiler', None)
+    if sampler is None:
+        return
+    sampler.stop()
+    meta = {
+        'name': g.profile_name,
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'path': request.path,
+        'status': g.get('profile_status', 500),
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'wall_ms': round(sampler.wall_ms, 1),
+        'interval_ms': app.config['PROFILE_INTERVAL_MS'],
+        'samples': sum(sampler.categories.values()),
+        'breakdown': sampler.breakdown()
+    }
+    try:
+        save_profile(g.profile_name, sampler, meta)
+        split = ', '.join(f"{category} {part['ms']} ms" for category, part in meta['breakdown'].items())
+        print(f"Profiled {request.method} {request.path}: {meta['wall_ms']} ms ({split})")
+    except OSError as e:
+        print(f"Error saving profile: {str(e)}")
+
 # Flask before_request hook to ensure DB is initialized for routes that need it
 @app.before_request
 def before_request():
@@ -227,8 +869,13 @@ def before_request():
     # Only initialize if we're accessing a route that needs the database
     # Skip for static files and simple routes
     # Wrap in try-except to prevent function invocation failures
+    global _first_request_ms
+    if _first_request_ms is None:
+        _first_request_ms = round((time.perf_counter() - _startup_started) * 1000, 2)
+    if request.endpoint and request.endpoint not in NO_DB_ENDPOINTS and db_breaker.is_open():
+        return degraded_response()
     try:
-        if request.endpoint and request.endpoint not in ['static', 'generate_qr']:
+        if request.endpoint and request.endpoint not in NO_DB_ENDPOINTS:
             ensure_db_initialized()
     except Exception as e:
         # Log error but don't fail the request - let individual routes handle DB errors
@@ -236,16 +883,1328 @@ def before_request():
         # Don't raise - allow the request to continue
         # Individual routes will handle their own DB connection errors
 
+class LRUCache:
+    """Small thread-safe in-process LRU cache"""
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+# Per-user dashboard rows (profile + usage summary), keyed by user id -> (loaded_at, row).
+# Writes only clear the entry in the worker that handled them, so rows also expire after
+# USER_SUMMARY_CACHE_TTL seconds for the other workers/instances to pick up changes.
+app.config['USER_SUMMARY_CACHE_TTL'] = float(os.getenv('USER_SUMMARY_CACHE_TTL', 10))
+user_summary_cache = LRUCache(maxsize=int(os.getenv('USER_SUMMARY_CACHE_SIZE', 2048)))
+user_summary_writes = LRUCache(maxsize=int(os.getenv('USER_SUMMARY_CACHE_SIZE', 2048)))  # user id -> last write
+
+def invalidate_user_summary(user_id):
+    """Drop a user's cached dashboard row after their write commits"""
+    user_summary_writes.set(user_id, time.monotonic())
+    user_summary_cache.pop(user_id)
+
+def current_month_key():
+    return datetime.now().strftime('%Y-%m')
+
+def record_user_activity(cur, user_id, new_balance, fare=None, bus_number=None, location=None, trip_at=None):
+    """Update the user's summary row inside the caller's transaction.
+
+    Pass ``fare`` for a trip (scan_qr); leave it as None for balance-only changes (topup).
+    ``trip_at`` is when a late-uploaded trip happened (offline taps); it only counts
+    towards this month if it was this month, and only becomes the last trip if newer.
+    Call after inserting the transaction row and ``invalidate_user_summary(user_id)``
+    after the caller commits.
+    """
+    month_key = current_month_key()
+    if fare is None:
+        cur.execute('UPDATE user_summary SET balance = %s WHERE user_id = %s', (new_balance, user_id))
+    else:
+        this_month = trip_at is None or trip_at.strftime('%Y-%m') == month_key
+        # Month counters reset when the stored month_key is stale; MySQL applies the SET
+        # clauses in order, so last_trip_at is compared before it is overwritten and
+        # month_key is assigned last
+        cur.execute('''
+            UPDATE user_summary SET
+                trips_this_month = IF(month_key = %s, trips_this_month, 0) + %s,
+                spend_this_month = IF(month_key = %s, spend_this_month, 0) + %s,
+                last_trip_bus = IF(last_trip_at IS NULL OR last_trip_at <= COALESCE(%s, NOW()), %s, last_trip_bus),
+                last_trip_location = IF(last_trip_at IS NULL OR last_trip_at <= COALESCE(%s, NOW()), %s, last_trip_location),
+                last_trip_at = IF(last_trip_at IS NULL OR last_trip_at <= COALESCE(%s, NOW()), COALESCE(%s, NOW()), last_trip_at),
+                balance = %s,
+                month_key = %s
+            WHERE user_id = %s
+        ''', (month_key, int(this_month), month_key, fare if this_month else 0,
+              trip_at, bus_number, trip_at, location, trip_at, trip_at, new_balance, month_key, user_id))
+    if cur.rowcount == 0:
+        # No summary row yet - build it from history, which already includes this write
+        backfill_user_summary(cur, user_id)
+
+def backfill_user_summary(cur, user_id):
+    """Build a missing summary row from the user's transaction history (runs once per user)"""
+    month_key = current_month_key()
+    cur.execute('''
+        INSERT IGNORE INTO user_summary
+            (user_id, month_key, trips_this_month, spend_this_month,
+             last_trip_at, last_trip_bus, last_trip_location, balance)
+        SELECT u.id, %s,
+               COUNT(m.id), COALESCE(SUM(m.amount), 0),
+               l.created_at, l.bus_number, l.location, COALESCE(u.balance, 0)
+        FROM user u
+        LEFT JOIN transactions m
+            ON m.user_id = u.id AND m.transaction_type = 'debit'
+           AND DATE_FORMAT(m.created_at, '%%Y-%%m') = %s
+        LEFT JOIN transactions l
+            ON l.id = (SELECT MAX(id) FROM transactions
+                       WHERE user_id = u.id AND transaction_type = 'debit')
+        WHERE u.id = %s
+        GROUP BY u.id, l.created_at, l.bus_number, l.location, u.balance
+    ''', (month_key, month_key, user_id))
+
+def get_dashboard_user(cur, user_id):
+    """Return the dashboard row for a user from the LRU, else one keyed read"""
+    cached = user_summary_cache.get(user_id)
+    if cached is not None and time.monotonic() - cached[0] < app.config['USER_SUMMARY_CACHE_TTL']:
+        return cached[1]
+
+    started = time.monotonic()
+    query = '''
+        SELECT {columns}
+        FROM user u
+        LEFT JOIN user_summary s ON s.user_id = u.id
+        WHERE u.id = %s
+    '''
+    user = fetch_one(cur, DashboardUser, query, (user_id,))
+    if user and user.month_key is None:
+        # First visit since the summary table was added - build it on the primary
+        primary_cur = request_cursor()
+        backfill_user_summary(primary_cur, user_id)
+        mysql.connection.commit()
+        user = fetch_one(primary_cur, DashboardUser, query, (user_id,))
+    if not user:
+        return None
+
+    if user.month_key != current_month_key():
+        user = user._replace(trips_this_month=0, spend_this_month=0.0)
+    else:
+        user = user._replace(spend_this_month=float(user.spend_this_month or 0))
+    # A write that committed while we were reading may already have cleared the cache -
+    # don't put the older row back
+    if (user_summary_writes.get(user_id) or 0) < started:
+        user_summary_cache.set(user_id, (started, user))
+    return user
+
+# Trip seat inventory
+# Seats are held per trip (bus x date x departure) instead of one counter per bus.
+# Trips for the next TRIP_DAYS_AHEAD days are bulk-generated by `flask generate-trips`
+# (or lazily, once a day per worker) and past trips are compacted away.
+DEFAULT_TRIP_DEPARTURE = '17:00'
+
+def parse_departures(values):
+    """Sorted departure times from HH:MM strings; bad entries are skipped, and none at all means 17:00"""
+    departures = set()
+    for value in values:
+        value = value.strip()
+        if not value:
+            continue
+        try:
+            departures.add(datetime.strptime(value, '%H:%M').time())
+        except ValueError:
+            print(f"Warning: ignoring TRIP_DEPARTURES entry {value!r} (expected HH:MM)")
+    if not departures:
+        departures.add(datetime.strptime(DEFAULT_TRIP_DEPARTURE, '%H:%M').time())
+    return sorted(departures)
+
+# Validated at startup so a bad setting can never leave next_trip_slot() without a departure
+app.config['TRIP_DEPARTURES'] = [t.strftime('%H:%M') for t in parse_departures(os.getenv('TRIP_DEPARTURES', DEFAULT_TRIP_DEPARTURE).split(','))]
+app.config['TRIP_DAYS_AHEAD'] = int(os.getenv('TRIP_DAYS_AHEAD', 21))
+app.config['TRIP_RETENTION_DAYS'] = int(os.getenv('TRIP_RETENTION_DAYS', 7))
+_trips_ensured_on = None
+
+def trip_departures():
+    return parse_departures(app.config['TRIP_DEPARTURES'])
+
+def next_trip_slot(now=None):
+    """(trip_date, departure) of the next departure that hasn't left yet"""
+    now = now or datetime.now()
+    departures = trip_departures()
+    for departure in departures:
+        if departure > now.time():
+            return now.date(), departure
+    return now.date() + timedelta(days=1), departures[0]
+
+def generate_trips(cur, start_date, days):
+    """Bulk-create trip rows for every bus and departure; existing trips are left untouched"""
+    cur.execute('SELECT bus_number, total_seats FROM bus')
+    buses = cur.fetchall()
+    rows = [
+        (bus_number, start_date + timedelta(days=offset), departure, total_seats, total_seats)
+        for offset in range(days)
+        for departure in trip_departures()
+        for bus_number, total_seats in buses
+    ]
+    if rows:
+        # PyMySQL turns this into multi-row INSERTs
+        cur.executemany('''
+            INSERT IGNORE INTO trip (bus_number, trip_date, departure, total_seats, available_seats)
+            VALUES (%s, %s, %s, %s, %s)
+        ''', rows)
+    return len(rows)
+
+def compact_trips(cur, before_date, batch_size=5000):
+    """Delete trips dated before `before_date` in small batches; returns rows removed"""
+    removed = 0
+    while True:
+        cur.execute('DELETE FROM trip WHERE trip_date < %s LIMIT %s', (before_date, batch_size))
+        mysql.connection.commit()
+        removed += cur.rowcount
+        if cur.rowcount < batch_size:
+            return removed
+
+def ensure_upcoming_trips():
+    """Make sure upcoming trips exist - runs at most once a day per worker"""
+    global _trips_ensured_on
+    today = datetime.now().date()
+    if _trips_ensured_on == today:
+        return
+    cur = mysql.connection.cursor()
+    try:
+        generate_trips(cur, today, app.config['TRIP_DAYS_AHEAD'])
+        mysql.connection.commit()
+        _trips_ensured_on = today
+    finally:
+        cur.close()
+
+# Bus list and rendered-fragment caches
+# Seat counts change on booking, so the bus list is reloaded after BUS_CACHE_TTL seconds
+# (other workers' bookings) or immediately when this worker books a seat.
+app.config['BUS_CACHE_TTL'] = float(os.getenv('BUS_CACHE_TTL', 15))
+_bus_cache = {'version': None, 'buses': None, 'loaded_at': 0.0}
+_bus_cache_lock = threading.Lock()
+fragment_cache = LRUCache(maxsize=64)
+
+def get_available_buses(cur):
+    """Return (version, bus_list) for buses with free seats on the next trip; version changes when the rows do"""
+    with _bus_cache_lock:
+        if _bus_cache['buses'] is not None and time.monotonic() - _bus_cache['loaded_at'] < app.config['BUS_CACHE_TTL']:
+            return _bus_cache['version'], _bus_cache['buses']
+
+    ensure_upcoming_trips()
+    trip_date, departure = next_trip_slot()
+    bus_list = fetch_all(cur, AvailableBus, '''
+        SELECT {columns}
+        FROM trip t
+        JOIN bus b ON b.bus_number = t.bus_number
+        WHERE t.trip_date = %s AND t.departure = %s AND t.available_seats > 0
+    ''', (trip_date, departure))
+    
+    version = hash(tuple(bus_list))
+    with _bus_cache_lock:
+        _bus_cache.update(version=version, buses=bus_list, loaded_at=time.monotonic())
+    return version, bus_list
+
+def invalidate_bus_cache():
+    """Force the next get_available_buses() call to reload from the database"""
+    with _bus_cache_lock:
+        _bus_cache['buses'] = None
+
+def render_fragment(template_name, version, **context):
+    """Render a shared template fragment once per data version"""
+    key = (template_name, version)
+    html = fragment_cache.get(key)
+    if html is None:
+        html = Markup(render_template(template_name, **context))
+        fragment_cache.set(key, html)
+    return html
+
+# Feedback ingestion
+# Feedback POSTs are queued and written in batches by a background thread.
+# Serverless instances can be frozen between requests, so Vercel defaults to synchronous writes.
+app.config['FEEDBACK_ASYNC'] = os.getenv('FEEDBACK_ASYNC', '0' if os.getenv('VERCEL') else '1') == '1'
+app.config['FEEDBACK_QUEUE_SIZE'] = int(os.getenv('FEEDBACK_QUEUE_SIZE', 1000))
+app.config['FEEDBACK_BATCH_SIZE'] = int(os.getenv('FEEDBACK_BATCH_SIZE', 50))
+app.config['FEEDBACK_FLUSH_INTERVAL'] = float(os.getenv('FEEDBACK_FLUSH_INTERVAL', 2))
+
+# Comma-separated USNs allowed to use staff pages
+app.config['STAFF_USNS'] = {u.strip().upper() for u in os.getenv('STAFF_USNS', '').split(',') if u.strip()}
+
+def is_staff():
+    return 'user_id' in session and (session.get('usn') or '').upper() in app.config['STAFF_USNS']
+
+FEEDBACK_TYPES = {'service', 'bus', 'driver', 'schedule', 'other'}
+
+def new_rollup():
+    return {'count': 0, 'sum': 0, 'histogram': [0, 0, 0, 0, 0]}
+
+def write_feedback_batch(cur, batch):
+    """Insert a batch of feedback rows and fold their ratings into feedback_rollup.
+
+    Each item is (user_id, feedback_type, rating, feedback_text, bus_number).
+    Returns the per-(scope, key) deltas that were written.
+    """
+    cur.executemany('''
+        INSERT INTO feedback (user_id, feedback_type, rating, feedback_text)
+        VALUES (%s, %s, %s, %s)
+    ''', [item[:4] for item in batch])
+
+    deltas = {}
+    for user_id, feedback_type, rating, feedback_text, bus_number in batch:
+        keys = [('type', feedback_type)]
+        if bus_number:
+            keys.append(('bus', str(bus_number)))
+        for key in keys:
+            rollup = deltas.setdefault(key, new_rollup())
+            rollup['count'] += 1
+            rollup['sum'] += rating
+            rollup['histogram'][rating - 1] += 1
+
+    cur.executemany('''
+        INSERT INTO feedback_rollup (scope, scope_key, rating_count, rating_sum, r1, r2, r3, r4, r5)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            rating_count = rating_count + VALUES(rating_count),
+            rating_sum = rating_sum + VALUES(rating_sum),
+            r1 = r1 + VALUES(r1), r2 = r2 + VALUES(r2), r3 = r3 + VALUES(r3),
+            r4 = r4 + VALUES(r4), r5 = r5 + VALUES(r5)
+    ''', [(scope, key, r['count'], r['sum'], *r['histogram']) for (scope, key), r in deltas.items()])
+    return deltas
+
+class FeedbackIngestor:
+    """Bounded in-process feedback queue drained in batches by a daemon thread"""
+    def __init__(self, app):
+        self.db = MySQL(app)  # own connection - the request connection is not thread-safe
+        self.queue = queue.Queue(maxsize=app.config['FEEDBACK_QUEUE_SIZE'])
+        self.batch_size = app.config['FEEDBACK_BATCH_SIZE']
+        self.flush_interval = app.config['FEEDBACK_FLUSH_INTERVAL']
+        self.rollups = {}  # (scope, key) -> rollup written by this process
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, item):
+        """Queue a feedback item; returns False when the queue is full"""
+        self.start()
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='feedback-ingestor', daemon=True)
+                self._thread.start()
+
+    def _take_batch(self, timeout):
+        batch = []
+        try:
+            batch.append(self.queue.get(timeout=timeout))
+            while len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch(self.flush_interval)
+            if batch:
+                self.flush(batch)
+
+    def flush(self, batch, retries=3):
+        for attempt in range(retries):
+            cur = None
+            try:
+                conn = self.db.get_connection()
+                cur = conn.cursor()
+                deltas = write_feedback_batch(cur, batch)
+                conn.commit()
+                self._apply(deltas)
+                return True
+            except (DataError, IntegrityError) as e:
+                # One bad row rejects the whole multi-row insert; retrying won't help,
+                # so write the rows one at a time and drop only the ones that fail
+                print(f"Error writing feedback batch, retrying row by row: {str(e)}")
+                self._reset()
+                return self._flush_rows(batch)
+            except Exception as e:
+                print(f"Error writing feedback batch (attempt {attempt + 1}): {str(e)}")
+                self._reset()
+                if attempt + 1 < retries:
+                    time.sleep(min(2 ** attempt, 10))
+            finally:
+                if cur:
+                    cur.close()
+        print(f"Dropping {len(batch)} feedback item(s) after {retries} failed attempts")
+        return False
+
+    def _flush_rows(self, batch):
+        written = 0
+        for item in batch:
+            cur = None
+            try:
+                conn = self.db.get_connection()
+                cur = conn.cursor()
+                deltas = write_feedback_batch(cur, [item])
+                conn.commit()
+                self._apply(deltas)
+                written += 1
+            except Exception as e:
+                print(f"Dropping feedback item from user {item[0]}: {str(e)}")
+                self._reset()
+            finally:
+                if cur:
+                    cur.close()
+        return written == len(batch)
+
+    def _reset(self):
+        try:
+            self.db.rollback()
+        except Exception:
+            self.db.close()
+
+    def drain(self):
+        """Flush whatever is still queued (called at interpreter exit)"""
+        while True:
+            batch = self._take_batch(0)
+            if not batch:
+                break
+            self.flush(batch, retries=1)
+
+    def _apply(self, deltas):
+        with self._lock:
+            for key, delta in deltas.items():
+                rollup = self.rollups.setdefault(key, new_rollup())
+                rollup['count'] += delta['count']
+                rollup['sum'] += delta['sum']
+                rollup['histogram'] = [a + b for a, b in zip(rollup['histogram'], delta['histogram'])]
+
+    def snapshot(self):
+        with self._lock:
+            return {key: dict(r, histogram=list(r['histogram'])) for key, r in self.rollups.items()}
+
+feedback_ingestor = FeedbackIngestor(app)
+atexit.register(feedback_ingestor.drain)
+mark_startup('caches and feedback ingestor')
+
+# Server-side sessions
+# The cookie only carries an opaque session id; session data lives in a backend.
+# SESSION_BACKEND: 'sqlite' (file shared by all workers on a host), 'memory' (single process)
+# or 'cookie' (Flask's signed cookie - default on Vercel where instances share no disk).
+app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND', 'cookie' if os.getenv('VERCEL') else 'sqlite')
+app.config['SESSION_TTL'] = int(os.getenv('SESSION_TTL', 86400))
+SESSION_REFRESH_INTERVAL = 60  # an unchanged session's expiry is pushed back at most once a minute
+app.config['SESSION_SQLITE_PATH'] = os.getenv('SESSION_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'bus-management-sessions.sqlite3'))
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that remembers its id and whether it was changed"""
+    def __init__(self, initial=None, sid=None, new=False, expires_at=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires_at = expires_at
+        self.modified = False
+
+class MemorySessionBackend:
+    """In-process LRU session store with TTL eviction"""
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # sid -> (expires_at, user_id, data)
+        self._by_user = {}  # user_id -> set of sids
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                self._remove(sid)
+                return None
+            self._data.move_to_end(sid)
+            return dict(entry[2]), entry[0]
+
+    def save(self, sid, data, user_id, ttl):
+        with self._lock:
+            self._remove(sid)
+            self._data[sid] = (time.time() + ttl, user_id, dict(data))
+            if user_id is not None:
+                self._by_user.setdefault(user_id, set()).add(sid)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def touch(self, sid, ttl):
+        with self._lock:
+            entry = self._data.get(sid)
+            if entry is not None:
+                self._data[sid] = (time.time() + ttl, entry[1], entry[2])
+
+    def delete(self, sid):
+        with self._lock:
+            self._remove(sid)
+
+    def revoke_user(self, user_id):
+        with self._lock:
+            sids = list(self._by_user.get(user_id, ()))
+            for sid in sids:
+                self._remove(sid)
+            return len(sids)
+
+    def _remove(self, sid):
+        entry = self._data.pop(sid, None)
+        if entry is not None and entry[1] is not None:
+            sids = self._by_user.get(entry[1])
+            if sids:
+                sids.discard(sid)
+                if not sids:
+                    del self._by_user[entry[1]]
+
+class SQLiteSessionBackend:
+    """Session store in a local SQLite file, shared by every worker on the host"""
+    def __init__(self, path, purge_every=500):
+        import sqlite3  # only loaded when this backend is selected
+        self.sqlite3 = sqlite3
+        self.path = path
+        self.purge_every = purge_every
+        self.serializer = TaggedJSONSerializer()
+        self._local = threading.local()
+        self._saves = 0
+        conn = self._connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                sid TEXT PRIMARY KEY,
+                user_id INTEGER,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS sessions_user_id ON sessions (user_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)')
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self.sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        row = self._connection().execute(
+            'SELECT data, expires_at FROM sessions WHERE sid = ? AND expires_at > ?', (sid, time.time())
+        ).fetchone()
+        return (self.serializer.loads(row[0]), row[1]) if row else None
+
+    def save(self, sid, data, user_id, ttl):
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO sessions (sid, user_id, data, expires_at) VALUES (?, ?, ?, ?)',
+            (sid, user_id, self.serializer.dumps(dict(data)), time.time() + ttl)
+        )
+        self._saves += 1
+        if self._saves % self.purge_every == 0:
+            conn.execute('DELETE FROM sessions WHERE expires_at <= ?', (time.time(),))
+        conn.commit()
+
+    def touch(self, sid, ttl):
+        conn = self._connection()
+        conn.execute('UPDATE sessions SET expires_at = ? WHERE sid = ?', (time.time() + ttl, sid))
+        conn.commit()
+
+    def delete(self, sid):
+        conn = self._connection()
+        conn.execute('DELETE FROM sessions WHERE sid = ?', (sid,))
+        conn.commit()
+
+    def revoke_user(self, user_id):
+        conn = self._connection()
+        count = conn.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,)).rowcount
+        conn.commit()
+        return count
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface that keeps only an opaque id in the cookie"""
+    def __init__(self, backend):
+        self.backend = backend
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            stored = self.backend.get(sid)
+            if stored is not None:
+                return ServerSession(stored[0], sid=sid, expires_at=stored[1])
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if not session:
+            if session.modified and not session.new:
+                self.backend.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        ttl = app.config['SESSION_TTL']
+        if not session.modified:
+            # SESSION_TTL is an idle timeout: keep active sessions alive without rewriting them
+            if session.expires_at is not None and session.expires_at < time.time() + ttl - SESSION_REFRESH_INTERVAL:
+                self.backend.touch(session.sid, ttl)
+            return
+        self.backend.save(session.sid, session, session.get('user_id'), ttl)
+        if session.new:
+            response.set_cookie(
+                name, session.sid,
+                max_age=ttl if session.permanent else None,
+                domain=domain, path=path,
+                secure=self.get_cookie_secure(app),
+                httponly=self.get_cookie_httponly(app),
+                samesite=self.get_cookie_samesite(app)
+            )
+
+def create_session_backend(name):
+    if name == 'memory':
+        return MemorySessionBackend()
+    if name == 'sqlite':
+        return SQLiteSessionBackend(app.config['SESSION_SQLITE_PATH'])
+    return None
+
+session_backend = None
+try:
+    session_backend = create_session_backend(app.config['SESSION_BACKEND'])
+except Exception as e:
+    print(f"Warning: session backend '{app.config['SESSION_BACKEND']}' unavailable, using cookie sessions: {str(e)}")
+if session_backend is not None:
+    app.session_interface = ServerSideSessionInterface(session_backend)
+
+mark_startup('session backend')
+
+# Fingerprinted static assets
+# scripts/build_assets.py writes content-hashed copies to static/dist plus a manifest.
+# url_for('static', ...) emits the hashed name, which is served with an immutable
+# Cache-Control and, when the browser accepts them, as WebP or precompressed gzip/brotli.
+IMMUTABLE_MAX_AGE = 31536000
+
+def load_asset_manifest():
+    path = os.path.join(app.static_folder, 'dist', 'manifest.json')
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Warning: ignoring asset manifest {path}: {str(e)}")
+        return {}
+
+asset_manifest = load_asset_manifest()
+_fingerprinted_assets = {entry['file']: entry for entry in asset_manifest.values()}
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    if endpoint == 'static':
+        entry = asset_manifest.get(values.get('filename'))
+        if entry:
+            values['filename'] = entry['file']
+
+def serve_static(filename):
+    """Static view: fingerprinted files get negotiated variants and long-lived caching"""
+    entry = _fingerprinted_assets.get(filename)
+    if entry is None:
+        return app.send_static_file(filename)
+
+    served = filename
+    encoding = None
+    vary = None
+    if entry.get('webp'):
+        vary = 'Accept'
+        if 'image/webp' in request.headers.get('Accept', ''):
+            served = entry['webp']
+    elif entry.get('gzip'):
+        vary = 'Accept-Encoding'
+        accepted = {value for value, quality in request.accept_encodings if quality > 0}
+        if entry.get('br') and 'br' in accepted:
+            served, encoding = filename + '.br', 'br'
+        elif 'gzip' in accepted:
+            served, encoding = filename + '.gz', 'gzip'
+
+    response = send_from_directory(app.static_folder, served, max_age=IMMUTABLE_MAX_AGE)
+    response.mimetype = mimetypes.guess_type(served if encoding is None else filename)[0] or 'application/octet-stream'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if vary:
+        response.vary.add(vary)
+    response.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return response
+
+app.view_functions['static'] = serve_static
+
+def regenerate_session():
+    """Move the session to a fresh id (call on login) so an id planted beforehand is useless"""
+    if isinstance(session, ServerSession) and not session.new:
+        session_backend.delete(session.sid)
+        session.sid = secrets.token_urlsafe(32)
+        session.new = True
+        session.modified = True
+
+def revoke_user_sessions(user_id):
+    """Log a user out everywhere; returns the number of sessions removed"""
+    if session_backend is None:
+        return 0
+    return session_backend.revoke_user(user_id)
+
+# Transaction partitions and archive
+# transactions is range-partitioned by month. Closed months older than
+# ARCHIVE_KEEP_MONTHS are moved by `flask archive-transactions` into gzipped NDJSON
+# files under ARCHIVE_DIR (one directory per month, rows bucketed by user id),
+# leaving a per-user summary row in transaction_archive_summary.
+app.config['ARCHIVE_DIR'] = os.getenv('ARCHIVE_DIR', os.path.join(app.root_path, 'archive'))
+app.config['ARCHIVE_KEEP_MONTHS'] = int(os.getenv('ARCHIVE_KEEP_MONTHS', 3))
+app.config['ARCHIVE_BUCKETS'] = int(os.getenv('ARCHIVE_BUCKETS', 64))
+TRANSACTION_PARTITIONS_AHEAD = 3
+
+def add_months(month_key, count):
+    year, month = map(int, month_key.split('-'))
+    index = year * 12 + (month - 1) + count
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def month_start(month_key):
+    return datetime.strptime(month_key + '-01', '%Y-%m-%d')
+
+def partition_name(month_key):
+    return 'p' + month_key.replace('-', '')
+
+def partition_definition(month_key):
+    return (f"PARTITION {partition_name(month_key)} VALUES LESS THAN "
+            f"(UNIX_TIMESTAMP('{month_start(add_months(month_key, 1)):%Y-%m-%d %H:%M:%S}'))")
+
+def get_transaction_partitions(cur):
+    """Names of the transactions partitions in order (empty if the table isn't partitioned)"""
+    cur.execute('''
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'transactions' AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    ''')
+    return [row[0] for row in cur.fetchall()]
+
+def ensure_transaction_partitions(cur, months_ahead=TRANSACTION_PARTITIONS_AHEAD):
+    """Split pmax so monthly partitions exist through `months_ahead` months from now"""
+    partitions = get_transaction_partitions(cur)
+    if not partitions:
+        return False
+    monthly = [p for p in partitions if p != 'pmax']
+    # Only append after the newest existing month - REORGANIZE can't insert in the middle
+    month = current_month_key()
+    if monthly:
+        newest = f"{monthly[-1][1:5]}-{monthly[-1][5:7]}"
+        month = max(month, add_months(newest, 1))
+    target = add_months(current_month_key(), months_ahead)
+    new_months = []
+    while month <= target:
+        new_months.append(month)
+        month = add_months(month, 1)
+    if new_months:
+        definitions = ', '.join(partition_definition(m) for m in new_months)
+        cur.execute(f"ALTER TABLE transactions REORGANIZE PARTITION pmax INTO "
+                    f"({definitions}, PARTITION pmax VALUES LESS THAN MAXVALUE)")
+    return True
+
+def partition_transactions_from(cur, first_month):
+    """(Re)partition transactions into one partition per month from first_month through this month, plus pmax"""
+    definitions = []
+    month = first_month
+    while month <= current_month_key():
+        definitions.append(partition_definition(month))
+        month = add_months(month, 1)
+    definitions.append('PARTITION pmax VALUES LESS THAN MAXVALUE')
+    cur.execute(f"ALTER TABLE transactions PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) ({', '.join(definitions)})")
+
+# Bucket index path -> {user id: [offset, length]}; archived months never change
+archive_index_cache = LRUCache(maxsize=256)
+
+def archive_bucket_path(month_key, user_id):
+    bucket = int(user_id) % app.config['ARCHIVE_BUCKETS']
+    return os.path.join(app.config['ARCHIVE_DIR'], 'transactions', month_key, f"bucket-{bucket:03d}.ndjson.gz")
+
+def archive_index_path(bucket_path):
+    return bucket_path[:-len('.ndjson.gz')] + '.index.json'
+
+def load_archive_index(bucket_path):
+    """The bucket's per-user offsets, or None for buckets written before indexes existed"""
+    path = archive_index_path(bucket_path)
+    index = archive_index_cache.get(path)
+    if index is None:
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        archive_index_cache.set(path, index)
+    return index
+
+def read_archived_transactions(user_id, month_key):
+    """A user's transactions for an archived month, newest first"""
+    path = archive_bucket_path(month_key, user_id)
+    transactions = []
+    if not os.path.exists(path):
+        return transactions
+    index = load_archive_index(path)
+    if index is not None:
+        # Each user's rows are their own gzip member: read just that byte range
+        entry = index.get(str(user_id))
+        if entry is None:
+            return transactions
+        with open(path, 'rb') as f:
+            f.seek(entry[0])
+            lines = gzip.decompress(f.read(entry[1])).decode('utf-8').splitlines()
+    else:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            lines = list(f)
+    for line in lines:
+        row = json.loads(line)
+        if row['user_id'] != user_id:
+            continue
+        transactions.append(UserTransaction(
+            row['id'], float(row['amount']), row['transaction_type'], row['description'],
+            row['bus_number'], row['location'], datetime.fromisoformat(row['created_at'])
+        ))
+    transactions.sort(key=lambda t: t.created_at, reverse=True)
+    return transactions
+
+class ArchiveBucketWriter:
+    """One bucket file, written as a gzip member per user plus an index of their byte ranges.
+
+    Rows must arrive grouped by user, as the archive query orders them by user_id.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.index = {}
+        self.user_id = None
+        self.lines = []
+
+    def write(self, user_id, line):
+        if user_id != self.user_id:
+            self.flush()
+            self.user_id = user_id
+        self.lines.append(line)
+
+    def flush(self):
+        if self.lines:
+            data = gzip.compress(''.join(self.lines).encode('utf-8'), mtime=0)
+            self.index[str(self.user_id)] = [self.file.tell(), len(data)]
+            self.file.write(data)
+            self.lines = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        with open(archive_index_path(self.path), 'w') as f:
+            json.dump(self.index, f)
+
+def drop_transaction_month(conn, cur, month_key):
+    """Remove an archived month's rows: a whole partition if there is one, otherwise in small batches"""
+    if partition_name(month_key) in get_transaction_partitions(cur):
+        cur.execute(f"ALTER TABLE transactions DROP PARTITION {partition_name(month_key)}")
+        return
+    start, end = month_start(month_key), month_start(add_months(month_key, 1))
+    while True:
+        cur.execute('DELETE FROM transactions WHERE created_at >= %s AND created_at < %s LIMIT 10000', (start, end))
+        conn.commit()
+        if cur.rowcount == 0:
+            break
+
+def archive_transaction_month(month_key):
+    """Move one closed month of transactions to the archive; returns the number of rows moved"""
+    conn = mysql.connection
+    cur = conn.cursor()
+    try:
+        cur.execute('SELECT 1 FROM transaction_archive WHERE month = %s', (month_key,))
+        if cur.fetchone():
+            # Archived by an earlier run that may have failed before its rows were dropped
+            drop_transaction_month(conn, cur, month_key)
+            return 0
+        start, end = month_start(month_key), month_start(add_months(month_key, 1))
+        month_dir = os.path.join(app.config['ARCHIVE_DIR'], 'transactions', month_key)
+        tmp_dir = month_dir + '.tmp'
+        if os.path.isdir(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+
+        # Stream the month out without loading it into memory
+        files = {}
+        row_count = 0
+        stream = mysql.get_connection().cursor(pymysql.cursors.SSCursor)
+        try:
+            stream.execute('''
+                SELECT id, user_id, amount, transaction_type, description, bus_number, location, created_at
+                FROM transactions
+                WHERE created_at >= %s AND created_at < %s
+                ORDER BY user_id, created_at
+            ''', (start, end))
+            for row in stream:
+                bucket = row[1] % app.config['ARCHIVE_BUCKETS']
+                if bucket not in files:
+                    files[bucket] = ArchiveBucketWriter(os.path.join(tmp_dir, f"bucket-{bucket:03d}.ndjson.gz"))
+                files[bucket].write(row[1], json.dumps({
+                    'id': row[0], 'user_id': row[1], 'amount': str(row[2]), 'transaction_type': row[3],
+                    'description': row[4], 'bus_number': row[5], 'location': row[6],
+                    'created_at': row[7].isoformat()
+                }) + '\n')
+                row_count += 1
+        finally:
+            stream.close()
+            for f in files.values():
+                f.close()
+        if os.path.isdir(month_dir):
+            shutil.rmtree(month_dir)
+        os.rename(tmp_dir, month_dir)
+
+        cur.execute('''
+            INSERT INTO transaction_archive_summary
+                (user_id, month, credit_count, credit_total, debit_count, debit_total)
+            SELECT user_id, %s,
+                   SUM(transaction_type = 'credit'), COALESCE(SUM(IF(transaction_type = 'credit', amount, 0)), 0),
+                   SUM(transaction_type = 'debit'), COALESCE(SUM(IF(transaction_type = 'debit', amount, 0)), 0)
+            FROM transactions
+            WHERE created_at >= %s AND created_at < %s
+            GROUP BY user_id
+            ON DUPLICATE KEY UPDATE
+                credit_count = VALUES(credit_count), credit_total = VALUES(credit_total),
+                debit_count = VALUES(debit_count), debit_total = VALUES(debit_total)
+        ''', (month_key, start, end))
+        cur.execute('INSERT INTO transaction_archive (month, path, row_count) VALUES (%s, %s, %s)',
+                    (month_key, month_dir, row_count))
+        conn.commit()
+
+        # A failure from here on is finished by the next run (see the check above)
+        drop_transaction_month(conn, cur, month_key)
+        return row_count
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+# Ridership analytics
+# Hourly boardings per bus and stop, peak-load curves and revenue per route, aggregated
+# with NumPy in analytics.py. Closed days are saved under ANALYTICS_DIR once and never
+# recomputed; reads go through mysql.read_connection so a replica takes the load.
+# analytics (and NumPy) is imported on first use to keep it out of cold starts.
+app.config['ANALYTICS_DIR'] = os.getenv('ANALYTICS_DIR', os.path.join(tempfile.gettempdir(), 'bus-management-analytics'))
+app.config['ANALYTICS_CHUNK_SIZE'] = int(os.getenv('ANALYTICS_CHUNK_SIZE', 10000))
+app.config['ANALYTICS_TODAY_TTL'] = int(os.getenv('ANALYTICS_TODAY_TTL', 60))
+app.config['ANALYTICS_MAX_DAYS'] = int(os.getenv('ANALYTICS_MAX_DAYS', 90))
+
+_ridership_analytics = None
+_ridership_lock = threading.Lock()
+
+def get_ridership_analytics():
+    global _ridership_analytics
+    with _ridership_lock:
+        if _ridership_analytics is None:
+            from analytics import RidershipAnalytics
+            _ridership_analytics = RidershipAnalytics(
+                # Unbuffered cursor: rows are streamed in chunks instead of loaded all at once
+                lambda: mysql.read_connection.cursor(pymysql.cursors.SSCursor),
+                os.path.join(app.config['ANALYTICS_DIR'], 'daily'),
+                chunk_size=app.config['ANALYTICS_CHUNK_SIZE'],
+                today_ttl=app.config['ANALYTICS_TODAY_TTL'],
+                # Offline scanners upload taps up to this many days late
+                open_days=app.config['SCANNER_MAX_TAP_AGE_DAYS'],
+                live_since=first_live_transaction_day
+            )
+        return _ridership_analytics
+
+def first_live_transaction_day():
+    """First day whose transactions have not been archived out of MySQL, or None"""
+    cur = mysql.read_connection.cursor()
+    try:
+        cur.execute('SELECT MAX(month) FROM transaction_archive')
+        row = cur.fetchone()
+    finally:
+        cur.close()
+    return month_start(add_months(row[0], 1)).date() if row and row[0] else None
+
+def get_bus_routes(cur):
+    cur.execute('SELECT bus_number, starting_point, ending_point FROM bus')
+    return {row[0]: f"{row[1]} - {row[2]}" for row in cur.fetchall()}
+
+# Fare settlement
+# Per-bus, per-day debit/credit totals and rider counts for accounts, kept current by an
+# hourly `flask settle-fares`. Only transactions past the id watermark are read: each
+# batch is scanned once into a temporary table and every total is upserted from it in
+# the same database transaction that moves the watermark, so an interrupted run simply
+# repeats its last batch. Ids are handed out before commit, so a run stops before the
+# first row inserted in the last SETTLEMENT_LAG seconds rather than risk skipping a
+# slower transaction. This uses inserted_at: created_at is backdated for offline taps.
+# wallet_ledger keeps each user's credits and debits, which balances are checked against.
+app.config['SETTLEMENT_BATCH_SIZE'] = int(os.getenv('SETTLEMENT_BATCH_SIZE', 200000))
+app.config['SETTLEMENT_LAG'] = int(os.getenv('SETTLEMENT_LAG', 60))
+
+SETTLEMENT_TABLES = ['bus_settlement', 'settlement_rider', 'wallet_ledger', 'wallet_mismatch', 'settlement_watermark']
+
+def settle_batch(cur, last_id, high_id):
+    """Fold transactions with last_id < id <= high_id into the settlement tables; returns rows read"""
+    cur.execute('DROP TEMPORARY TABLE IF EXISTS settlement_batch')
+    cur.execute('''
+        CREATE TEMPORARY TABLE settlement_batch AS
+        SELECT DATE(created_at) AS settle_date, COALESCE(bus_number, 'N/A') AS bus_number, user_id,
+               transaction_type, COUNT(*) AS n, SUM(amount) AS total
+        FROM transactions
+        WHERE id > %s AND id <= %s
+        GROUP BY DATE(created_at), COALESCE(bus_number, 'N/A'), user_id, transaction_type
+    ''', (last_id, high_id))
+    cur.execute('SELECT COALESCE(SUM(n), 0) FROM settlement_batch')
+    rows = int(cur.fetchone()[0])
+
+    cur.execute('''
+        INSERT INTO bus_settlement (settle_date, bus_number, debit_count, debit_total, credit_count, credit_total)
+        SELECT settle_date, bus_number,
+               SUM(IF(transaction_type = 'debit', n, 0)), SUM(IF(transaction_type = 'debit', total, 0)),
+               SUM(IF(transaction_type = 'credit', n, 0)), SUM(IF(transaction_type = 'credit', total, 0))
+        FROM settlement_batch
+        GROUP BY settle_date, bus_number
+        ON DUPLICATE KEY UPDATE
+            debit_count = debit_count + VALUES(debit_count), debit_total = debit_total + VALUES(debit_total),
+            credit_count = credit_count + VALUES(credit_count), credit_total = credit_total + VALUES(credit_total)
+    ''')
+    # Riders are distinct per bus and day: count only the ones this batch adds
+    cur.execute('''
+        UPDATE bus_settlement s
+        JOIN (
+            SELECT b.settle_date, b.bus_number, COUNT(*) AS added
+            FROM settlement_batch b
+            LEFT JOIN settlement_rider r
+                ON r.settle_date = b.settle_date AND r.bus_number = b.bus_number AND r.user_id = b.user_id
+            WHERE b.transaction_type = 'debit' AND r.user_id IS NULL
+            GROUP BY b.settle_date, b.bus_number
+        ) a ON a.settle_date = s.settle_date AND a.bus_number = s.bus_number
+        SET s.riders = s.riders + a.added
+    ''')
+    cur.execute('''
+        INSERT IGNORE INTO settlement_rider (settle_date, bus_number, user_id)
+        SELECT settle_date, bus_number, user_id FROM settlement_batch WHERE transaction_type = 'debit'
+    ''')
+    cur.execute('''
+        INSERT INTO wallet_ledger (user_id, credit_total, debit_total)
+        SELECT user_id, SUM(IF(transaction_type = 'credit', total, 0)), SUM(IF(transaction_type = 'debit', total, 0))
+        FROM settlement_batch
+        GROUP BY user_id
+        ON DUPLICATE KEY UPDATE
+            credit_total = credit_total + VALUES(credit_total), debit_total = debit_total + VALUES(debit_total)
+    ''')
+    cur.execute('DROP TEMPORARY TABLE settlement_batch')
+    return rows
+
+def flag_wallet_mismatches(cur, last_id):
+    """Replace wallet_mismatch with users whose balance isn't their credits minus debits; returns the count"""
+    # One consistent read: the ledger up to the watermark plus whatever was written since
+    cur.execute('''
+        SELECT u.id, u.balance, COALESCE(l.credit_total - l.debit_total, 0) + COALESCE(p.net, 0)
+        FROM user u
+        LEFT JOIN wallet_ledger l ON l.user_id = u.id
+        LEFT JOIN (
+            SELECT user_id, SUM(IF(transaction_type = 'credit', amount, -amount)) AS net
+            FROM transactions
+            WHERE id > %s
+            GROUP BY user_id
+        ) p ON p.user_id = u.id
+        WHERE COALESCE(u.balance, 0) <> COALESCE(l.credit_total - l.debit_total, 0) + COALESCE(p.net, 0)
+    ''', (last_id,))
+    mismatches = cur.fetchall()
+    cur.execute('DELETE FROM wallet_mismatch')
+    cur.executemany('INSERT INTO wallet_mismatch (user_id, balance, expected) VALUES (%s, %s, %s)', mismatches)
+    return len(mismatches)
+
+def settle_transactions(batch_size=None, progress=None):
+    """Settle every transaction past the watermark, then flag wallet mismatches.
+
+    Returns (rows settled, users whose balance doesn't match their ledger).
+    """
+    batch_size = batch_size or app.config['SETTLEMENT_BATCH_SIZE']
+    conn = mysql.connection
+    cur = conn.cursor()
+    settled = 0
+    try:
+        cur.execute("INSERT IGNORE INTO settlement_watermark (source, last_id) VALUES ('transactions', 0)")
+        if cur.rowcount:
+            # First run: months archived before settlement existed still count towards balances
+            cur.execute('''
+                INSERT INTO wallet_ledger (user_id, credit_total, debit_total)
+                SELECT user_id, SUM(credit_total), SUM(debit_total)
+                FROM transaction_archive_summary
+                GROUP BY user_id
+            ''')
+        conn.commit()
+
+        # This run settles up to, not including, the first recently inserted row
+        cur.execute("SELECT last_id FROM settlement_watermark WHERE source = 'transactions'")
+        cur.execute('''
+            SELECT COALESCE(
+                (SELECT MIN(id) - 1 FROM transactions
+                 WHERE id > %s AND inserted_at >= NOW() - INTERVAL %s SECOND),
+                (SELECT MAX(id) FROM transactions)
+            )
+        ''', (cur.fetchone()[0], app.config['SETTLEMENT_LAG']))
+        until_id = cur.fetchone()[0] or 0
+        conn.commit()
+
+        while True:
+            # Row lock on the watermark keeps overlapping runs from settling a batch twice
+            cur.execute("SELECT last_id FROM settlement_watermark WHERE source = 'transactions' FOR UPDATE")
+            last_id = cur.fetchone()[0]
+            cur.execute('''
+                SELECT MAX(id) FROM (
+                    SELECT id FROM transactions
+                    WHERE id > %s AND id <= %s
+                    ORDER BY id
+                    LIMIT %s
+                ) batch
+            ''', (last_id, until_id, batch_size))
+            high_id = cur.fetchone()[0]
+            if high_id is None:
+                conn.commit()
+                break
+            rows = settle_batch(cur, last_id, high_id)
+            cur.execute("UPDATE settlement_watermark SET last_id = %s, settled_at = NOW() WHERE source = 'transactions'",
+                        (high_id,))
+            conn.commit()
+            settled += rows
+            if progress:
+                progress(f"Settled {rows} transaction(s) up to id {high_id}")
+
+        mismatches = flag_wallet_mismatches(cur, last_id)
+        conn.commit()
+        return settled, mismatches
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+# Offline scanner snapshots
+# Scanners on buses that lose signal validate taps against a signed snapshot of who may
+# board: a bitset over user ids, bit N set when user N's balance covers the bus fare.
+# Buses with the same fare share one bitset, so refreshing every bus costs one scan of
+# `user` per SCANNER_SNAPSHOT_TTL. Versions are content hashes and recent bitsets are
+# kept by version, so a scanner can fetch only the ids that changed since its copy.
+# Taps are uploaded later and charged once per (bus, tap id).
+app.config['SCANNER_TOKEN'] = os.getenv('SCANNER_TOKEN', '')
+# Scanners hold this key to verify snapshots, so it must never be SECRET_KEY (which signs sessions)
+app.config['SCANNER_SIGNING_KEY'] = os.getenv('SCANNER_SIGNING_KEY', '')
+app.config['SCANNER_SNAPSHOT_TTL'] = int(os.getenv('SCANNER_SNAPSHOT_TTL', 120))
+app.config['SCANNER_MAX_TAP_AGE_DAYS'] = int(os.getenv('SCANNER_MAX_TAP_AGE_DAYS', 7))
+
+scanner_bitsets = LRUCache(maxsize=256)  # version -> bitset, base for delta updates
+_scanner_state = {'loaded_at': None, 'fares': {}, 'snapshots': {}}
+_scanner_lock = threading.Lock()
+
+def build_eligibility_bitset(rows, fare):
+    """Bitset over user ids (bit id % 8 of byte id // 8), set when balance >= fare"""
+    bits = bytearray(max((row[0] for row in rows), default=0) // 8 + 1)
+    for user_id, balance in rows:
+        if balance is not None and float(balance) >= fare:
+            bits[user_id >> 3] |= 1 << (user_id & 7)
+    return bytes(bits)
+
+def bitset_changes(old, new):
+    """Return (ids newly set, ids cleared) between two bitsets"""
+    size = max(len(old), len(new))
+    old, new = old.ljust(size, b'\0'), new.ljust(size, b'\0')
+    added, removed = [], []
+    for i in range(size):
+        if old[i] != new[i]:
+            for bit in range(8):
+                was, now = old[i] >> bit & 1, new[i] >> bit & 1
+                if now and not was:
+                    added.append(i * 8 + bit)
+                elif was and not now:
+                    removed.append(i * 8 + bit)
+    return added, removed
+
+def get_scanner_snapshots():
+    """Return ({bus_number: fare}, {fare: (version, generated_at, bitset)}), rebuilt every SCANNER_SNAPSHOT_TTL"""
+    with _scanner_lock:
+        loaded_at = _scanner_state['loaded_at']
+        if loaded_at is not None and time.monotonic() - loaded_at < app.config['SCANNER_SNAPSHOT_TTL']:
+            return _scanner_state['fares'], _scanner_state['snapshots']
+        cur = mysql.read_connection.cursor()
+        try:
+            cur.execute('SELECT bus_number, fare FROM bus')
+            fares = {row[0]: float(row[1]) for row in cur.fetchall()}
+            cur.execute('SELECT id, balance FROM user')
+            rows = cur.fetchall()
+        finally:
+            cur.close()
+        generated_at = int(time.time())
+        snapshots = {}
+        for fare in set(fares.values()):
+            bits = build_eligibility_bitset(rows, fare)
+            version = hashlib.sha256(f"{fare:.2f}:".encode() + bits).hexdigest()[:16]
+            scanner_bitsets.set(version, bits)
+            snapshots[fare] = (version, generated_at, bits)
+        _scanner_state.update(loaded_at=time.monotonic(), fares=fares, snapshots=snapshots)
+        return fares, snapshots
+
+def sign_scanner_payload(payload):
+    """HMAC-SHA256 over the payload serialized with sorted keys and no whitespace"""
+    message = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()
+    return hmac.new(app.config['SCANNER_SIGNING_KEY'].encode(), message, hashlib.sha256).hexdigest()
+
+def scanner_authorized():
+    """Scanners send `Authorization: Bearer <SCANNER_TOKEN>`; staff sessions are also allowed"""
+    token = app.config['SCANNER_TOKEN']
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    return bool(token and hmac.compare_digest(supplied, token)) or is_staff()
+
+# Admin database browser
+# /view-db shows one table a page at a time using keyset pagination: each page seeks
+# past the last (sort value, id) it showed, so it costs the same on page 1 and page
+# 10,000. Sorting is limited to indexed columns and search is a LIKE 'prefix%' range
+# scan. Totals come from information_schema estimates, or a capped count when
+# searching, and are cached for ADMIN_COUNT_TTL seconds.
+app.config['ADMIN_PAGE_SIZE'] = int(os.getenv('ADMIN_PAGE_SIZE', 50))
+app.config['ADMIN_COUNT_TTL'] = int(os.getenv('ADMIN_COUNT_TTL', 300))
+app.config['ADMIN_COUNT_CAP'] = int(os.getenv('ADMIN_COUNT_CAP', 1000))
+
+# table -> row model, unique key used as the tie-breaker, sortable (indexed) columns, prefix-searchable columns
+ADMIN_TABLES = {
+    'user': {'model': UserListing, 'key': 'id', 'sort': ['id', 'usn', 'name', 'email'], 'search': ['usn', 'name', 'email']},
+    'transactions': {'model': TransactionListing, 'key': 'id', 'sort': ['id'], 'search': []},
+    'bus': {'model': BusListing, 'key': 'bus_number', 'sort': ['bus_number'], 'search': ['bus_number']}
+}
+
+admin_count_cache = LRUCache(maxsize=256)  # (table, field, prefix) -> (expires_at, count, capped)
+
+def ensure_index(cur, table, name, columns):
+    """CREATE INDEX unless an index with this name already exists (MySQL has no IF NOT EXISTS here)"""
+    cur.execute('''
+        SELECT 1 FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        LIMIT 1
+    ''', (table, name))
+    if not cur.fetchone():
+        cur.execute(f"CREATE INDEX `{name}` ON `{table}` ({columns})")
+
+def ensure_column(cur, table, name, definition):
+    """ADD COLUMN unless the table already has it"""
+    cur.execute('''
+        SELECT 1 FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    ''', (table, name))
+    if not cur.fetchone():
+        cur.execute(f"ALTER TABLE `{table}` ADD COLUMN `{name}` {definition}")
+
+def encode_page_token(row, sort, key):
+    values = [getattr(row, sort), getattr(row, key)]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_page_token(token):
+    values = json.loads(base64.urlsafe_b64decode(token.encode()))
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError('Invalid page token')
+    return values
+
+def like_prefix(prefix):
+    return prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+def estimated_count(cur, table, field=None, prefix=None):
+    """(count, capped): table estimate from information_schema, or a count capped at ADMIN_COUNT_CAP"""
+    cache_key = (table, field, prefix)
+    cached = admin_count_cache.get(cache_key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1], cached[2]
+    if field:
+        cap = app.config['ADMIN_COUNT_CAP']
+        cur.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM `{table}` WHERE `{field}` LIKE %s LIMIT %s) matches",
+                    (like_prefix(prefix), cap + 1))
+        count = cur.fetchone()[0]
+        count, capped = min(count, cap), count > cap
+    else:
+        cur.execute('''
+            SELECT TABLE_ROWS FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ''', (table,))
+        row = cur.fetchone()
+        count, capped = int(row[0] or 0) if row else 0, False
+    admin_count_cache.set(cache_key, (time.monotonic() + app.config['ADMIN_COUNT_TTL'], count, capped))
+    return count, capped
+
+def fetch_admin_page(cur, table, sort, descending, page_size, field=None, prefix=None, user_id=None, after=None, before=None):
+    """One page of `table` ordered by (sort, key); returns (rows, has_more_after, has_more_before)"""
+    spec = ADMIN_TABLES[table]
+    key = spec['key']
+    conditions, params = [], []
+    if field:
+        conditions.append(f"`{field}` LIKE %s")
+        params.append(like_prefix(prefix))
+    if user_id is not None:
+        conditions.append('user_id = %s')
+        params.append(user_id)
+
+    # Paging backwards walks the index in the opposite direction and flips the result
+    backwards = before is not None
+    seek = after if after is not None else before
+    forward_desc = descending != backwards
+    if seek is not None:
+        op = '<' if forward_desc else '>'
+        if sort == key:
+            conditions.append(f"`{key}` {op} %s")
+            params.append(seek[1])
+        else:
+            conditions.append(f"(`{sort}` {op} %s OR (`{sort}` = %s AND `{key}` {op} %s))")
+            params += [seek[0], seek[0], seek[1]]
+
+    order = 'DESC' if forward_desc else 'ASC'
+    order_by = f"`{sort}` {order}" if sort == key else f"`{sort}` {order}, `{key}` {order}"
+    query = f"SELECT {{columns}} FROM `{table}`"
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += f" ORDER BY {order_by} LIMIT %s"
+    rows = fetch_all(cur, spec['model'], query, params + [page_size + 1])
+
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+        return rows, True, more
+    return rows, more, seek is not None
+
+# Distance (km) from each served town to the college
+TOWN_DISTANCES = {
+    'Kundapura': 30,
+    'Udupi': 8.5,
+    'Manipal': 12,
+    'Brahmavar': 15,
+    'Mangalore': 25
+}
+
 # Helper function to calculate distance
 def calculate_distance(address):
-    distances = {
-        'Kundapura': 30,
-        'Udupi': 8.5,
-        'Manipal': 12,
-        'Brahmavar': 15,
-        'Mangalore': 25
-    }
-    for location, distance in distances.items():
+    for location, distance in TOWN_DISTANCES.items():
         if location.lower() in address.lower():
             return distance
     return 10
@@ -299,7 +2258,7 @@ def register():
             
             # Get database connection
             try:
-                cur = mysql.connection.cursor()
+                cur = request_cursor()
             except ConnectionError as db_conn_error:
                 error_msg = str(db_conn_error)
                 print(f"Database connection error: {error_msg}")
@@ -323,12 +2282,10 @@ def register():
                 existing_user = cur.fetchone()
                 if existing_user:
                     existing_usn = existing_user[1] if len(existing_user) > 1 else usn
-                    cur.close()
                     flash(f'USN "{existing_usn}" is already registered. If this is your USN, please login instead. Otherwise, use a different USN.', 'error')
                     return render_template('register.html')
             except Exception as check_error:
                 print(f"Error checking USN: {str(check_error)}")
-                cur.close()
                 flash('Error checking USN. Please try again.', 'error')
                 return render_template('register.html')
             
@@ -336,12 +2293,10 @@ def register():
             try:
                 cur.execute('SELECT id FROM user WHERE email = %s', (email,))
                 if cur.fetchone():
-                    cur.close()
                     flash(f'Email "{email}" is already registered. Please use a different email or login.', 'error')
                     return render_template('register.html')
             except Exception as check_error:
                 print(f"Error checking email: {str(check_error)}")
-                cur.close()
                 flash('Error checking email. Please try again.', 'error')
                 return render_template('register.html')
             
@@ -352,7 +2307,6 @@ def register():
                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                 ''', (usn, name, phone, email, hashed_password, bus_number, address, distance, 0))
                 mysql.connection.commit()
-                cur.close()
                 
                 flash('Registration successful! Please login.', 'success')
                 return redirect(url_for('login'))
@@ -369,8 +2323,6 @@ def register():
                         flash('This information is already registered. Please check your details and try again.', 'error')
                 else:
                     flash('Registration failed due to database constraint. Please check your information.', 'error')
-                if cur:
-                    cur.close()
                 return render_template('register.html')
             except PyMySQLError as e:
                 mysql.connection.rollback()
@@ -380,15 +2332,11 @@ def register():
                     flash('Database connection error. Please try again later.', 'error')
                 else:
                     flash(f'Database error: {error_msg}. Please try again.', 'error')
-                if cur:
-                    cur.close()
                 return render_template('register.html')
         except KeyError as e:
             # Missing form field
             missing_field = str(e).replace("'", "")
             flash(f'Missing required field: {missing_field}. Please fill in all fields.', 'error')
-            if cur:
-                cur.close()
             return render_template('register.html')
         except Exception as e:
             # Handle any other errors
@@ -400,7 +2348,6 @@ def register():
             if cur:
                 try:
                     mysql.connection.rollback()
-                    cur.close()
                 except:
                     pass
             flash(f'Registration failed: {error_msg}. Please check all fields and try again.', 'error')
@@ -414,15 +2361,14 @@ def login():
         usn = request.form['usn']
         password = request.form['password']
         
-        cur = mysql.connection.cursor()
-        cur.execute('SELECT * FROM user WHERE usn = %s', (usn,))
-        user = cur.fetchone()
-        cur.close()
+        user = fetch_one(request_cursor(), LoginUser, 'SELECT {columns} FROM user WHERE usn = %s', (usn,))
         
-        if user and check_password_hash(user[5], password):
-            session['user_id'] = user[0]
-            session['usn'] = user[1]
-            session['name'] = user[2]
+        if user and check_password_hash(user.password, password):
+            regenerate_session()
+            session['user_id'] = user.id
+            session['usn'] = user.usn
+            session['name'] = user.name
+            session['bus_number'] = user.bus_number
             return redirect(url_for('dashboard'))
         else:
             flash('Invalid USN or password', 'error')
@@ -434,69 +2380,34 @@ def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    cur = mysql.connection.cursor()
+    cur = request_cursor(read=True)
     
     try:
-        # Get user details
-        cur.execute('''
-            SELECT id, usn, name, phone, email, bus_number, address, balance 
-            FROM user 
-            WHERE id = %s
-        ''', (session['user_id'],))
-        user = cur.fetchone()
+        # Get user details and usage summary
+        user = get_dashboard_user(cur, session['user_id'])
         
         if not user:
             flash('User not found', 'error')
             return redirect(url_for('login'))
         
-        # Get all available buses
-        cur.execute('''
-            SELECT bus_number, starting_point, ending_point, total_seats, available_seats, fare
-            FROM bus 
-            WHERE available_seats > 0
-        ''')
-        buses = cur.fetchall()
-        
-        # Convert user tuple to dictionary for easier template access
-        user_dict = {
-            'id': user[0],
-            'usn': user[1],
-            'name': user[2],
-            'phone': user[3],
-            'email': user[4],
-            'bus_number': user[5],
-            'address': user[6],
-            'balance': user[7]
-        }
-        
-        # Convert bus tuples to dictionaries
-        bus_list = []
-        for bus in buses:
-            bus_dict = {
-                'bus_number': bus[0],
-                'starting_point': bus[1],
-                'ending_point': bus[2],
-                'total_seats': bus[3],
-                'seats_left': bus[4],
-                'fare': bus[5]
-            }
-            bus_list.append(bus_dict)
+        # Bus table is shared by every user - render it once per seat-count version
+        bus_version, bus_list = get_available_buses(cur)
+        bus_table = render_fragment('_bus_table.html', bus_version, buses=bus_list)
         
-        return render_template('dashboard.html', user=user_dict, buses=bus_list)
+        departures = [t.strftime('%I:%M %p').lstrip('0') for t in trip_departures()]
+        return render_template('dashboard.html', user=user, bus_table=bus_table, departures=departures)
         
     except Exception as e:
         print(f"Error in dashboard: {str(e)}")
         flash('An error occurred while loading the dashboard', 'error')
         return redirect(url_for('login'))
-    finally:
-        cur.close()
 
 @app.route('/topup', methods=['GET', 'POST'])
 def topup():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    cur = mysql.connection.cursor()
+    cur = request_cursor()
     try:
         # Get current balance
         cur.execute('SELECT balance FROM user WHERE id = %s', (session['user_id'],))
@@ -527,10 +2438,11 @@ def topup():
                     VALUES (%s, %s, %s, %s, %s, %s, NOW())
                 ''', (session['user_id'], amount, 'credit', f'Top up via {payment_method}', 'N/A', 'N/A'))
                 
-                mysql.connection.commit()
+                record_user_activity(cur, session['user_id'], new_balance)
                 
-                # Update session with new balance
-                session['balance'] = new_balance
+                mysql.connection.commit()
+                invalidate_user_summary(session['user_id'])
+                mark_user_write()
                 
                 # Show success message and stay on the same page
                 flash(f'Top up successful! ₹{amount:.2f} added to your account. New balance: ₹{new_balance:.2f}', 'success')
@@ -548,8 +2460,6 @@ def topup():
         print(f"Error in topup route: {str(e)}")
         flash('An error occurred. Please try again.', 'error')
         return redirect(url_for('dashboard'))
-    finally:
-        cur.close()
 
 @app.route('/qr_scan')
 def qr_scan():
@@ -562,48 +2472,45 @@ def view_transactions():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    cur = mysql.connection.cursor()
+    month = request.args.get('month')
+    cur = request_cursor(read=True)
     try:
-        # Get all transactions with full details
-        cur.execute('''
-            SELECT 
-                id,
-                amount,
-                transaction_type,
-                description,
-                bus_number,
-                location,
-                created_at
-            FROM transactions 
-            WHERE user_id = %s 
-            ORDER BY created_at DESC
+        # Months that have been moved to the archive, with the totals kept for them
+        archived_months = fetch_all(cur, ArchivedMonth, '''
+            SELECT {columns}
+            FROM transaction_archive_summary
+            WHERE user_id = %s
+            ORDER BY month DESC
         ''', (session['user_id'],))
         
-        transactions = []
-        for t in cur.fetchall():
-            transaction = {
-                'id': t[0],
-                'amount': float(t[1]),
-                'transaction_type': t[2],
-                'description': t[3],
-                'bus_number': t[4],
-                'location': t[5],
-                'created_at': t[6]
-            }
-            transactions.append(transaction)
-            print(f"Found transaction: {transaction}")  # Debug logging
+        if month and any(m.month == month for m in archived_months):
+            transactions = read_archived_transactions(session['user_id'], month)
+        else:
+            query = '''
+                SELECT {columns}
+                FROM transactions
+                WHERE user_id = %s
+            '''
+            params = [session['user_id']]
+            if month:
+                # Restricting created_at lets MySQL prune to a single partition
+                try:
+                    params += [month_start(month), month_start(add_months(month, 1))]
+                except ValueError:
+                    flash('Invalid month', 'error')
+                    return redirect(url_for('view_transactions'))
+                query += ' AND created_at >= %s AND created_at < %s'
+            transactions = fetch_all(cur, UserTransaction, query + ' ORDER BY created_at DESC', params)
         
-        if not transactions:
-            print("No transactions found for user")  # Debug logging
+        if not transactions and not archived_months:
             flash('No transactions found', 'info')
         
-        return render_template('transaction.html', transactions=transactions)
+        return render_template('transaction.html', transactions=transactions,
+                               archived_months=archived_months, month=month)
     except Exception as e:
         print(f"Error in view_transactions: {str(e)}")  # Debug logging
         flash('An error occurred while loading transactions', 'error')
         return redirect(url_for('dashboard'))
-    finally:
-        cur.close()
 
 @app.route('/view_bus_location')
 def view_bus_location():
@@ -616,11 +2523,19 @@ def book_bus(bus_id):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    cur = mysql.connection.cursor()
+    trip_date, departure = next_trip_slot()
+    trip_query = '''
+        SELECT {columns}
+        FROM trip t
+        JOIN bus b ON b.bus_number = t.bus_number
+        WHERE t.trip_date = %s AND t.departure = %s AND t.bus_number = %s
+    '''
+    cur = request_cursor()
     try:
-        # Get bus details
-        cur.execute('SELECT * FROM bus WHERE bus_number = %s', (bus_id,))
-        bus = cur.fetchone()
+        ensure_upcoming_trips()
+        
+        # Get bus details and seats on its next trip
+        bus = fetch_one(cur, TripBus, trip_query, (trip_date, departure, bus_id))
         
         if not bus:
             flash('Bus not found', 'error')
@@ -633,26 +2548,31 @@ def book_bus(bus_id):
                 # Validate seats
                 if seats <= 0:
                     flash('Please enter a valid number of seats', 'error')
-                    return render_template('booking.html', bus=bus)
+                    return render_template('booking.html', bus=bus, trip_date=trip_date, departure=departure)
                 
-                if seats > bus[4]:  # available_seats
-                    flash(f'Only {bus[4]} seats available', 'error')
-                    return render_template('booking.html', bus=bus)
+                # Reserve seats on this trip only if enough are still free
+                cur.execute('''
+                    UPDATE trip SET available_seats = available_seats - %s
+                    WHERE id = %s AND available_seats >= %s
+                ''', (seats, bus.trip_id, seats))
                 
-                # Update available seats
-                cur.execute('UPDATE bus SET available_seats = available_seats - %s WHERE bus_number = %s', 
-                          (seats, bus_id))
+                if cur.rowcount == 0:
+                    mysql.connection.rollback()
+                    bus = fetch_one(cur, TripBus, trip_query, (trip_date, departure, bus_id))
+                    flash(f'Only {bus.available_seats} seats available', 'error')
+                    return render_template('booking.html', bus=bus, trip_date=trip_date, departure=departure)
                 
                 mysql.connection.commit()
+                invalidate_bus_cache()
+                mark_user_write()
                 
                 # Show success message and updated bus info
                 flash(f'Successfully booked {seats} seat(s) for Bus {bus_id}! Remember to scan the QR code at the bus stop to pay the fare.', 'success')
                 
                 # Get updated bus info
-                cur.execute('SELECT * FROM bus WHERE bus_number = %s', (bus_id,))
-                updated_bus = cur.fetchone()
+                updated_bus = fetch_one(cur, TripBus, trip_query, (trip_date, departure, bus_id))
                 
-                return render_template('booking.html', bus=updated_bus)
+                return render_template('booking.html', bus=updated_bus, trip_date=trip_date, departure=departure)
                 
             except ValueError:
                 flash('Please enter a valid number of seats', 'error')
@@ -661,22 +2581,29 @@ def book_bus(bus_id):
                 flash('An error occurred while booking. Please try again.', 'error')
                 mysql.connection.rollback()
         
-        return render_template('booking.html', bus=bus)
+        return render_template('booking.html', bus=bus, trip_date=trip_date, departure=departure)
         
     except Exception as e:
         print(f"Error in book_bus route: {str(e)}")
         flash('An error occurred. Please try again.', 'error')
         return redirect(url_for('dashboard'))
-    finally:
-        cur.close()
 
 @app.route('/logout')
 def logout():
     session.clear()
     return redirect(url_for('login'))
 
+@app.route('/staff/revoke-sessions/<int:user_id>', methods=['POST'])
+def revoke_sessions(user_id):
+    if not is_staff():
+        return jsonify({'error': 'Forbidden'}), 403
+    revoked = revoke_user_sessions(user_id)
+    return jsonify({'success': True, 'revoked': revoked})
+
 @app.route('/generate-qr')
 def generate_qr():
+    import qrcode
+    
     # Create QR code with bus information
     qr = qrcode.QRCode(
         version=1,
@@ -726,7 +2653,7 @@ def scan_qr():
         if not isinstance(bus_info, dict) or 'bus_number' not in bus_info:
             return jsonify({'success': False, 'message': 'Invalid QR code data'})
         
-        cur = mysql.connection.cursor()
+        cur = request_cursor()
         
         # Get user's current balance
         cur.execute('SELECT balance FROM user WHERE id = %s', (session['user_id'],))
@@ -759,8 +2686,11 @@ def scan_qr():
             VALUES (%s, %s, %s, %s, %s, %s)
         ''', (session['user_id'], fare, 'debit', f'Bus fare payment - {location}', bus_number, location))
         
+        record_user_activity(cur, session['user_id'], new_balance, fare, bus_number, location)
+        
         mysql.connection.commit()
-        cur.close()
+        invalidate_user_summary(session['user_id'])
+        mark_user_write()
         
         return jsonify({
             'success': True, 
@@ -771,6 +2701,120 @@ def scan_qr():
         print(f"Error in scan_qr: {str(e)}")
         return jsonify({'success': False, 'message': f'Error processing QR code: {str(e)}'})
 
+@app.route('/scanner/<bus_number>/snapshot')
+def scanner_snapshot(bus_number):
+    """Signed eligible-rider snapshot for one bus; pass ?since=<version> for a delta"""
+    if not scanner_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    key = app.config['SCANNER_SIGNING_KEY']
+    if not key or key == app.secret_key:
+        print("Error serving scanner snapshot: set SCANNER_SIGNING_KEY to a key separate from SECRET_KEY")
+        return jsonify({'error': 'Scanner snapshots are not configured'}), 503
+    try:
+        fares, snapshots = get_scanner_snapshots()
+    except Exception as e:
+        print(f"Error building scanner snapshot: {str(e)}")
+        return jsonify({'error': 'Snapshot unavailable'}), 503
+    if bus_number not in fares:
+        return jsonify({'error': 'Bus not found'}), 404
+
+    fare = fares[bus_number]
+    version, generated_at, bits = snapshots[fare]
+    payload = {
+        'bus_number': bus_number,
+        'fare': f"{fare:.2f}",
+        'version': version,
+        'generated_at': generated_at,
+        'max_user_id': len(bits) * 8 - 1
+    }
+    since = request.args.get('since')
+    base = scanner_bitsets.get(since) if since and since != version else None
+    if since == version:
+        payload['type'] = 'unchanged'
+    elif base is not None:
+        payload['type'] = 'delta'
+        payload['base'] = since
+        payload['eligible'], payload['ineligible'] = bitset_changes(base, bits)
+    else:
+        payload['type'] = 'full'
+        payload['encoding'] = 'zlib+base64, bit (id % 8) of byte (id // 8)'
+        payload['bitset'] = base64.b64encode(zlib.compress(bits, 9)).decode()
+    payload['signature'] = sign_scanner_payload(payload)
+    return jsonify(payload)
+
+@app.route('/scanner/<bus_number>/taps', methods=['POST'])
+def upload_scanner_taps(bus_number):
+    """Charge taps a scanner validated offline: {"taps": [{"id", "user_id", "tapped_at", "location"?, "version"?}]}
+
+    Riders already boarded on the scanner's say-so, so fares are charged even if the
+    balance has since dropped below the fare. Re-uploading the same tap id is a no-op.
+    """
+    if not scanner_authorized():
+        return jsonify({'error': 'Forbidden'}), 403
+    data = request.get_json(silent=True) or {}
+    taps = data.get('taps')
+    if not isinstance(taps, list):
+        return jsonify({'error': 'Expected a list of taps'}), 400
+
+    now = datetime.now()
+    oldest = now - timedelta(days=app.config['SCANNER_MAX_TAP_AGE_DAYS'])
+    accepted, duplicates, rejected = 0, 0, []
+    charged_users = set()
+    cur = request_cursor()
+    try:
+        cur.execute('SELECT fare FROM bus WHERE bus_number = %s', (bus_number,))
+        bus = cur.fetchone()
+        if not bus:
+            return jsonify({'error': 'Bus not found'}), 404
+        fare = float(bus[0])
+
+        for tap in taps:
+            try:
+                tap_id = str(tap['id'])[:64]
+                user_id = int(tap['user_id'])
+                tapped_at = datetime.fromtimestamp(int(tap['tapped_at']))
+                location = str(tap.get('location') or 'Offline scanner')[:100]
+            except (KeyError, TypeError, ValueError, OverflowError, OSError):
+                rejected.append({'tap': tap.get('id') if isinstance(tap, dict) else None, 'reason': 'malformed'})
+                continue
+            if not oldest <= tapped_at <= now + timedelta(minutes=5):
+                rejected.append({'tap': tap_id, 'reason': 'tapped_at out of range'})
+                continue
+
+            cur.execute('SELECT balance FROM user WHERE id = %s FOR UPDATE', (user_id,))
+            user = cur.fetchone()
+            if not user:
+                rejected.append({'tap': tap_id, 'reason': 'unknown user'})
+                continue
+            cur.execute('''
+                INSERT IGNORE INTO offline_tap (tap_id, bus_number, user_id, tapped_at, snapshot_version, charged)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            ''', (tap_id, bus_number, user_id, tapped_at, str(tap.get('version') or '')[:16] or None, fare))
+            if cur.rowcount == 0:
+                duplicates += 1
+                continue
+
+            new_balance = (float(user[0]) if user[0] is not None else 0.0) - fare
+            cur.execute('UPDATE user SET balance = %s WHERE id = %s', (new_balance, user_id))
+            cur.execute('''
+                INSERT INTO transactions (user_id, amount, transaction_type, description, bus_number, location, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ''', (user_id, fare, 'debit', f'Bus fare payment (offline) - {location}', bus_number, location, tapped_at))
+            record_user_activity(cur, user_id, new_balance, fare, bus_number, location, trip_at=tapped_at)
+            charged_users.add(user_id)
+            accepted += 1
+
+        mysql.connection.commit()
+    except Exception as e:
+        # Nothing is kept - the scanner retries the whole batch
+        mysql.connection.rollback()
+        print(f"Error uploading scanner taps: {str(e)}")
+        return jsonify({'error': 'Could not record taps, retry later'}), 503
+
+    for user_id in charged_users:
+        invalidate_user_summary(user_id)
+    return jsonify({'accepted': accepted, 'duplicates': duplicates, 'rejected': rejected})
+
 @app.route('/view-qr-code')
 def view_qr_code():
     if 'user_id' not in session:
@@ -785,24 +2829,31 @@ def respond_notification():
     notification_id = request.form.get('notification_id')
     response = request.form.get('response')
     
-    cur = mysql.connection.cursor()
+    cur = request_cursor()
     try:
         if response == 'yes':
-            # Check if seats are available
-            cur.execute('SELECT available_seats FROM bus WHERE bus_number = %s', (session.get('bus_number'),))
-            available_seats = cur.fetchone()[0]
+            ensure_upcoming_trips()
+            trip_date, departure = next_trip_slot()
+            
+            # Take a seat on the next trip of the user's bus if one is free
+            cur.execute('''
+                UPDATE trip SET available_seats = available_seats - 1
+                WHERE trip_date = %s AND departure = %s AND bus_number = %s AND available_seats > 0
+            ''', (trip_date, departure, session.get('bus_number')))
             
-            if available_seats > 0:
-                # Update available seats
-                cur.execute('UPDATE bus SET available_seats = available_seats - 1 WHERE bus_number = %s', 
-                          (session.get('bus_number'),))
+            if cur.rowcount > 0:
                 mysql.connection.commit()
+                invalidate_bus_cache()
+                mark_user_write()
                 flash('Your seat has been confirmed!', 'success')
             else:
-                # Show alternative buses
-                cur.execute('SELECT * FROM bus WHERE route_from = %s AND route_to = %s AND bus_number != %s AND available_seats > 0', 
-                          (session.get('route_from'), session.get('route_to'), session.get('bus_number')))
-                alternative_buses = cur.fetchall()
+                # Show other buses with seats on the same trip
+                alternative_buses = fetch_all(cur, AvailableBus, '''
+                    SELECT {columns}
+                    FROM trip t
+                    JOIN bus b ON b.bus_number = t.bus_number
+                    WHERE t.trip_date = %s AND t.departure = %s AND t.bus_number != %s AND t.available_seats > 0
+                ''', (trip_date, departure, session.get('bus_number')))
                 flash('Your regular bus is full. Please select an alternative bus.', 'warning')
                 return render_template('notification.html', alternative_buses=alternative_buses)
         else:
@@ -814,25 +2865,27 @@ def respond_notification():
         print(f"Error in respond_notification: {str(e)}")
         flash('An error occurred. Please try again.', 'error')
         return redirect(url_for('notification'))
-    finally:
-        cur.close()
 
 @app.route('/select-alternative-bus/<int:bus_number>', methods=['POST'])
 def select_alternative_bus(bus_number):
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    cur = mysql.connection.cursor()
+    trip_date, departure = next_trip_slot()
+    cur = request_cursor()
     try:
-        # Check if seats are available in the alternative bus
-        cur.execute('SELECT available_seats FROM bus WHERE bus_number = %s', (bus_number,))
-        available_seats = cur.fetchone()[0]
+        ensure_upcoming_trips()
+        
+        # Take a seat on the alternative bus's next trip if one is still free
+        cur.execute('''
+            UPDATE trip SET available_seats = available_seats - 1
+            WHERE trip_date = %s AND departure = %s AND bus_number = %s AND available_seats > 0
+        ''', (trip_date, departure, bus_number))
         
-        if available_seats > 0:
-            # Update available seats
-            cur.execute('UPDATE bus SET available_seats = available_seats - 1 WHERE bus_number = %s', 
-                      (bus_number,))
+        if cur.rowcount > 0:
             mysql.connection.commit()
+            invalidate_bus_cache()
+            mark_user_write()
             flash(f'Successfully booked seat in Bus {bus_number}!', 'success')
         else:
             flash('Sorry, this bus is now full. Please try another alternative.', 'error')
@@ -843,15 +2896,13 @@ def select_alternative_bus(bus_number):
         print(f"Error in select_alternative_bus: {str(e)}")
         flash('An error occurred. Please try again.', 'error')
         return redirect(url_for('notification'))
-    finally:
-        cur.close()
 
 @app.route('/notification')
 def notification():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    cur = mysql.connection.cursor()
+    cur = request_cursor(read=True)
     try:
         # Get user's bus details
         cur.execute('SELECT bus_number FROM user WHERE id = %s', (session['user_id'],))
@@ -865,8 +2916,6 @@ def notification():
         print(f"Error in notification route: {str(e)}")
         flash('An error occurred while loading notifications', 'error')
         return redirect(url_for('dashboard'))
-    finally:
-        cur.close()
 
 @app.route('/test-db')
 def test_db():
@@ -933,6 +2982,22 @@ def test_db():
         }
         return jsonify(diagnostic_info), 500
 
+@app.route('/healthz')
+def healthz():
+    """Liveness probe - the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness probe - reports the database circuit breaker from memory, never touches the DB"""
+    breaker = db_breaker.status()
+    ready = breaker['state'] != CircuitBreaker.OPEN or not db_breaker.is_open()
+    return jsonify({
+        'status': 'ready' if ready else 'degraded',
+        'database': breaker,
+        'replicas': [replica.status() for replica in replicas]
+    }), 200 if ready else 503
+
 @app.route('/db-config')
 def db_config():
     """Show database configuration (without sensitive data) - for debugging"""
@@ -964,56 +3029,92 @@ def db_config():
 def view_db():
     if 'user_id' not in session:
         return redirect(url_for('login'))
+    if not is_staff():
+        flash('The database browser is only available to staff', 'error')
+        return redirect(url_for('dashboard'))
     
-    cur = mysql.connection.cursor()
+    table = request.args.get('table', 'user')
+    if table not in ADMIN_TABLES:
+        table = 'user'
+    spec = ADMIN_TABLES[table]
+    prefix = request.args.get('q', '').strip()
+    field = request.args.get('field') if prefix else None
+    if field not in spec['search']:
+        field = spec['search'][0] if prefix and spec['search'] else None
+    # A prefix search is an index range scan, so results are ordered by the searched column
+    sort = field or request.args.get('sort')
+    if sort not in spec['sort']:
+        sort = spec['key']
+    descending = request.args.get('dir', 'desc' if sort == 'id' else 'asc') == 'desc'
+    page_size = min(max(request.args.get('per_page', app.config['ADMIN_PAGE_SIZE'], type=int), 1), 200)
+    user_id = request.args.get('user_id', type=int) if table == 'transactions' else None
+    
+    cur = request_cursor(read=True)
     try:
-        # Get user table contents
-        cur.execute('SELECT * FROM user')
-        users = cur.fetchall()
-        
-        # Get transactions table contents
-        cur.execute('SELECT * FROM transactions')
-        transactions = cur.fetchall()
+        after = decode_page_token(request.args['after']) if request.args.get('after') else None
+        before = decode_page_token(request.args['before']) if request.args.get('before') else None
+    except (ValueError, TypeError):
+        flash('Invalid page link', 'error')
+        return redirect(url_for('view_db', table=table))
+    
+    try:
+        rows, has_next, has_prev = fetch_admin_page(cur, table, sort, descending, page_size, field, prefix,
+                                                    user_id, after, before)
+        count, capped = (None, False) if user_id is not None else estimated_count(cur, table, field, prefix)
         
-        # Get bus table contents
-        cur.execute('SELECT * FROM bus')
-        buses = cur.fetchall()
+        params = {'table': table, 'sort': sort, 'dir': 'desc' if descending else 'asc', 'per_page': page_size}
+        if field:
+            params.update(q=prefix, field=field)
+        if user_id is not None:
+            params['user_id'] = user_id
+        next_url = url_for('view_db', after=encode_page_token(rows[-1], sort, spec['key']), **params) if rows and has_next else None
+        prev_url = url_for('view_db', before=encode_page_token(rows[0], sort, spec['key']), **params) if rows and has_prev else None
         
-        return render_template('view_db.html', 
-                             users=users, 
-                             transactions=transactions, 
-                             buses=buses)
+        return render_template('view_db.html',
+                             tables=list(ADMIN_TABLES),
+                             table=table,
+                             columns=spec['model']._fields,
+                             sortable=spec['sort'],
+                             searchable=spec['search'],
+                             rows=rows,
+                             sort=sort,
+                             descending=descending,
+                             q=prefix,
+                             field=field,
+                             user_id=user_id,
+                             count=count,
+                             capped=capped,
+                             next_url=next_url,
+                             prev_url=prev_url)
     except Exception as e:
         print(f"Error viewing database: {str(e)}")
         flash('Error viewing database', 'error')
         return redirect(url_for('dashboard'))
-    finally:
-        cur.close()
 
 @app.route('/print-db')
 def print_db():
     if 'user_id' not in session:
         return redirect(url_for('login'))
+    if not is_staff():
+        return jsonify({'error': 'Forbidden'}), 403
     
-    cur = mysql.connection.cursor()
+    # Unbuffered cursor: rows are printed as they arrive instead of loading whole tables
+    cur = mysql.read_connection.cursor(pymysql.cursors.SSCursor)
     try:
         print("\n=== USERS TABLE ===")
-        cur.execute('SELECT * FROM user')
-        users = cur.fetchall()
-        for user in users:
-            print(f"ID: {user[0]}, USN: {user[1]}, Name: {user[2]}, Phone: {user[3]}, Email: {user[4]}, Bus: {user[6]}, Balance: {user[8]}")
+        cur.execute(f"SELECT {UserListing.columns} FROM user")
+        for user in map(UserListing._make, cur):
+            print(f"ID: {user.id}, USN: {user.usn}, Name: {user.name}, Phone: {user.phone}, Email: {user.email}, Bus: {user.bus_number}, Balance: {user.balance}")
         
         print("\n=== TRANSACTIONS TABLE ===")
-        cur.execute('SELECT * FROM transactions')
-        transactions = cur.fetchall()
-        for trans in transactions:
-            print(f"ID: {trans[0]}, User: {trans[1]}, Amount: {trans[2]}, Type: {trans[3]}, Desc: {trans[4]}, Bus: {trans[5]}, Location: {trans[6]}, Date: {trans[7]}")
+        cur.execute(f"SELECT {TransactionListing.columns} FROM transactions")
+        for trans in map(TransactionListing._make, cur):
+            print(f"ID: {trans.id}, User: {trans.user_id}, Amount: {trans.amount}, Type: {trans.transaction_type}, Desc: {trans.description}, Bus: {trans.bus_number}, Location: {trans.location}, Date: {trans.created_at}")
         
         print("\n=== BUS TABLE ===")
-        cur.execute('SELECT * FROM bus')
-        buses = cur.fetchall()
-        for bus in buses:
-            print(f"Bus: {bus[0]}, From: {bus[1]}, To: {bus[2]}, Total Seats: {bus[3]}, Available: {bus[4]}, Fare: {bus[5]}")
+        cur.execute(f"SELECT {BusListing.columns} FROM bus")
+        for bus in map(BusListing._make, cur):
+            print(f"Bus: {bus.bus_number}, From: {bus.starting_point}, To: {bus.ending_point}, Total Seats: {bus.total_seats}, Available: {bus.available_seats}, Fare: {bus.fare}")
         
         return "Database contents printed to console. Check your terminal."
     except Exception as e:
@@ -1032,14 +3133,19 @@ def submit_feedback():
         rating = int(request.form['rating'])
         feedback_text = request.form['feedback_text']
         
-        cur = mysql.connection.cursor()
-        cur.execute('''
-            INSERT INTO feedback (user_id, feedback_type, rating, feedback_text)
-            VALUES (%s, %s, %s, %s)
-        ''', (session['user_id'], feedback_type, rating, feedback_text))
+        if rating < 1 or rating > 5:
+            flash('Please choose a rating between 1 and 5.', 'error')
+            return redirect(url_for('dashboard'))
+        if feedback_type not in FEEDBACK_TYPES:
+            flash('Please choose a feedback type.', 'error')
+            return redirect(url_for('dashboard'))
         
-        mysql.connection.commit()
-        cur.close()
+        item = (session['user_id'], feedback_type, rating, feedback_text, session.get('bus_number'))
+        
+        # Fall back to a synchronous write when async ingestion is off or the queue is full
+        if not (app.config['FEEDBACK_ASYNC'] and feedback_ingestor.submit(item)):
+            write_feedback_batch(request_cursor(), [item])
+            mysql.connection.commit()
         
         flash('Thank you for your feedback!', 'success')
     except Exception as e:
@@ -1048,6 +3154,142 @@ def submit_feedback():
     
     return redirect(url_for('dashboard'))
 
+@app.route('/staff/feedback-summary')
+def feedback_summary():
+    """Average ratings per feedback type and per bus, read from the rollup table"""
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    if not is_staff():
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    def summarize(count, total, histogram):
+        return {
+            'count': count,
+            'average': round(total / count, 2) if count else None,
+            'histogram': {str(i + 1): n for i, n in enumerate(histogram)}
+        }
+    
+    result = {'source': 'rollup_table', 'type': {}, 'bus': {}}
+    try:
+        cur = request_cursor(read=True)
+        cur.execute('SELECT scope, scope_key, rating_count, rating_sum, r1, r2, r3, r4, r5 FROM feedback_rollup')
+        for row in cur.fetchall():
+            result[row[0]][row[1]] = summarize(int(row[2]), int(row[3]), [int(n) for n in row[4:9]])
+    except Exception as e:
+        # Database unavailable - report what this process has ingested
+        print(f"Error reading feedback rollups: {str(e)}")
+        result['source'] = 'in_memory'
+        for (scope, key), r in feedback_ingestor.snapshot().items():
+            result[scope][key] = summarize(r['count'], r['sum'], r['histogram'])
+    result['queued'] = feedback_ingestor.queue.qsize()
+    return jsonify(result)
+
+@app.route('/staff/profiles')
+def list_profiles():
+    """Saved request profiles, newest first, with their SQL/template/Python breakdown"""
+    if not is_staff():
+        return jsonify({'error': 'Forbidden'}), 403
+    directory = app.config['PROFILE_DIR']
+    profiles = []
+    if os.path.isdir(directory):
+        for name in sorted((n for n in os.listdir(directory) if n.endswith('.json')), reverse=True):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            meta['download'] = url_for('download_profile', name=meta['name'])
+            profiles.append(meta)
+    return jsonify({'profiles': profiles, 'keep': app.config['PROFILE_KEEP'],
+                    'sample_rate': app.config['PROFILE_SAMPLE_RATE']})
+
+@app.route('/staff/profiles/<name>')
+def download_profile(name):
+    """Collapsed stacks for one profile - feed to flamegraph.pl or speedscope"""
+    if not is_staff():
+        return jsonify({'error': 'Forbidden'}), 403
+    return send_from_directory(app.config['PROFILE_DIR'], name + '.folded', mimetype='text/plain', as_attachment=True)
+
+@app.route('/staff/ridership')
+def ridership_report():
+    """Boardings per bus/stop by hour, peak-load curves and revenue per route as JSON"""
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    if not is_staff():
+        return jsonify({'error': 'Forbidden'}), 403
+
+    try:
+        days = min(max(int(request.args.get('days', 7)), 1), app.config['ANALYTICS_MAX_DAYS'])
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else datetime.now().date()
+    except ValueError:
+        return jsonify({'error': 'Invalid days or end date'}), 400
+    start = end - timedelta(days=days - 1)
+
+    try:
+        routes = get_bus_routes(request_cursor(read=True))
+        body = get_ridership_analytics().report_json(start, end, routes)
+    except Exception as e:
+        print(f"Error building ridership report: {str(e)}")
+        return jsonify({'error': 'Ridership report unavailable'}), 503
+    return app.response_class(body, mimetype='application/json', headers={'Cache-Control': 'private, max-age=60'})
+
+@app.route('/staff/settlement')
+def settlement_report():
+    """Settled per-bus daily totals and flagged wallet balance mismatches as JSON"""
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    if not is_staff():
+        return jsonify({'error': 'Forbidden'}), 403
+
+    try:
+        days = min(max(int(request.args.get('days', 7)), 1), 366)
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else datetime.now().date()
+    except ValueError:
+        return jsonify({'error': 'Invalid days or end date'}), 400
+    start = end - timedelta(days=days - 1)
+
+    try:
+        cur = request_cursor(read=True)
+        rows = fetch_all(cur, BusSettlement, '''
+            SELECT {columns} FROM bus_settlement
+            WHERE settle_date BETWEEN %s AND %s
+            ORDER BY settle_date, bus_number
+        ''', (start, end))
+        mismatches = fetch_all(cur, WalletMismatch, '''
+            SELECT {columns} FROM wallet_mismatch m JOIN user u ON u.id = m.user_id
+            ORDER BY m.user_id
+        ''')
+        cur.execute("SELECT last_id, settled_at FROM settlement_watermark WHERE source = 'transactions'")
+        watermark = cur.fetchone()
+    except Exception as e:
+        print(f"Error reading settlement: {str(e)}")
+        return jsonify({'error': 'Settlement unavailable'}), 503
+
+    money = lambda value: round(float(value or 0), 2)
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'settled_through_id': watermark[0] if watermark else 0,
+        'settled_at': watermark[1].isoformat(timespec='seconds') if watermark and watermark[1] else None,
+        'days': [
+            dict(row._asdict(), settle_date=row.settle_date.isoformat(), debit_total=money(row.debit_total),
+                 credit_total=money(row.credit_total))
+            for row in rows
+        ],
+        'totals': {
+            'debit_count': sum(row.debit_count for row in rows),
+            'debit_total': money(sum(row.debit_total for row in rows)),
+            'credit_count': sum(row.credit_count for row in rows),
+            'credit_total': money(sum(row.credit_total for row in rows))
+        },
+        'wallet_mismatches': [
+            {'user_id': m.user_id, 'usn': m.usn, 'balance': money(m.balance), 'expected': money(m.expected),
+             'difference': money((m.balance or 0) - m.expected),
+             'detected_at': m.detected_at.isoformat(timespec='seconds') if m.detected_at else None}
+            for m in mismatches
+        ]
+    })
+
 @app.errorhandler(404)
 def not_found(error):
     return render_template('404.html'), 404
@@ -1073,6 +3315,213 @@ def handle_exception(e):
         # Fallback if even error handling fails
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/startup-report')
+def startup_report():
+    """Per-stage module load timings for this instance - useful for tracking cold starts"""
+    return jsonify(get_startup_report())
+
+def get_startup_report():
+    return {
+        'stages': _startup_stages,
+        'module_load_ms': round(sum(stage['ms'] for stage in _startup_stages), 2),
+        'first_request_ms': _first_request_ms,
+        'uptime_s': round(time.perf_counter() - _startup_started, 1),
+        'qr_stack_loaded': 'qrcode' in sys.modules,
+        'session_backend': app.config['SESSION_BACKEND'] if session_backend is not None else 'cookie'
+    }
+
+@app.cli.command('partition-transactions')
+@click.option('--ahead', default=TRANSACTION_PARTITIONS_AHEAD, show_default=True, help='Months of partitions to create ahead of today')
+def partition_transactions_command(ahead):
+    """Partition transactions by month (converting an existing table) and add upcoming months"""
+    cur = mysql.connection.cursor()
+    try:
+        if not get_transaction_partitions(cur):
+            click.echo('Converting transactions to monthly range partitions...')
+            # Partitioned tables can't have foreign keys, and the partition column must be in the primary key
+            cur.execute('''
+                SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+                WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = 'transactions'
+            ''')
+            for (constraint,) in cur.fetchall():
+                cur.execute(f"ALTER TABLE transactions DROP FOREIGN KEY `{constraint}`")
+            cur.execute('UPDATE transactions SET created_at = NOW() WHERE created_at IS NULL')
+            mysql.connection.commit()
+            cur.execute('''
+                ALTER TABLE transactions
+                    MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                    DROP PRIMARY KEY,
+                    ADD PRIMARY KEY (id, created_at),
+                    ADD KEY user_created (user_id, created_at)
+            ''')
+            cur.execute("SELECT DATE_FORMAT(MIN(created_at), '%Y-%m') FROM transactions")
+            partition_transactions_from(cur, cur.fetchone()[0] or current_month_key())
+        ensure_transaction_partitions(cur, ahead)
+        click.echo(f"transactions partitions: {', '.join(get_transaction_partitions(cur))}")
+    finally:
+        cur.close()
+
+@app.cli.command('generate-trips')
+@click.option('--days', default=None, type=int, help='Days of trips to create from today (default TRIP_DAYS_AHEAD)')
+def generate_trips_command(days):
+    """Create upcoming trip seat inventory and compact expired trips"""
+    days = days or app.config['TRIP_DAYS_AHEAD']
+    today = datetime.now().date()
+    cur = mysql.connection.cursor()
+    try:
+        count = generate_trips(cur, today, days)
+        mysql.connection.commit()
+        removed = compact_trips(cur, today - timedelta(days=app.config['TRIP_RETENTION_DAYS']))
+    finally:
+        cur.close()
+    click.echo(f"Ensured {count} trip(s) for the next {days} day(s); removed {removed} expired trip(s)")
+
+@app.cli.command('archive-transactions')
+@click.option('--keep-months', default=None, type=int, help='Months to keep live, including the current one (default ARCHIVE_KEEP_MONTHS)')
+def archive_transactions_command(keep_months):
+    """Move closed months older than the retention window into the on-disk archive"""
+    keep_months = keep_months or app.config['ARCHIVE_KEEP_MONTHS']
+    cutoff = add_months(current_month_key(), -(keep_months - 1))
+    cur = mysql.connection.cursor()
+    try:
+        cur.execute("SELECT DATE_FORMAT(MIN(created_at), '%Y-%m') FROM transactions")
+        month = cur.fetchone()[0]
+    finally:
+        cur.close()
+    if month is None:
+        click.echo('No transactions to archive')
+        return
+    if month < cutoff:
+        # Settle everything first - archived rows are gone from transactions
+        settled, _ = settle_transactions()
+        click.echo(f"Settled {settled} transaction(s) before archiving")
+    while month < cutoff:
+        # Save the month's ridership aggregates while its rows are still in MySQL
+        first_day = datetime.strptime(month, '%Y-%m').date()
+        get_ridership_analytics().update(first_day, datetime.strptime(add_months(month, 1), '%Y-%m').date() - timedelta(days=1),
+                                         final=True)
+        rows = archive_transaction_month(month)
+        click.echo(f"{month}: archived {rows} row(s)")
+        month = add_months(month, 1)
+
+@app.cli.command('generate-dataset')
+@click.option('--users', default=50000, show_default=True)
+@click.option('--buses', default=300, show_default=True)
+@click.option('--transactions', default=20000000, show_default=True, help='Fare and top-up rows (plus one opening top-up per user)')
+@click.option('--days', default=180, show_default=True, help='Days of history ending yesterday')
+@click.option('--seed', default=42, show_default=True)
+@click.option('--password', default='password123', show_default=True, help='Password every generated user logs in with')
+@click.option('--out', 'out_dir', default=None, help='Directory for the generated files (default /tmp/bus-dataset-<seed>)')
+@click.option('--method', type=click.Choice(['load-data', 'insert']), default='load-data', show_default=True,
+              help='LOAD DATA LOCAL INFILE, or multi-row INSERTs where local_infile is disabled')
+@click.option('--files-only', is_flag=True, help='Only write the files')
+@click.option('--replace', is_flag=True, help='Empty the tables first (otherwise they must be empty)')
+def generate_dataset_command(users, buses, transactions, days, seed, password, out_dir, method, files_only, replace):
+    """Generate a seeded, production-scale dataset and bulk-load it"""
+    from dataset import DatasetGenerator, TABLE_COLUMNS, read_rows
+    out_dir = out_dir or os.path.join(tempfile.gettempdir(), f"bus-dataset-{seed}")
+    generator = DatasetGenerator(out_dir, TOWN_DISTANCES, generate_password_hash(password), users=users, buses=buses,
+                                 transactions=transactions, days=days, seed=seed)
+    started = time.monotonic()
+    click.echo(f"Writing {out_dir} ({generator.start_date} to {generator.end_date}, seed {seed})")
+    counts = generator.generate(progress=click.echo)
+    click.echo(f"Generated in {time.monotonic() - started:.0f}s")
+    if files_only:
+        return
+
+    loader = MySQL(app, local_infile=method == 'load-data')
+    conn = loader.get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('''
+            SELECT TABLE_NAME FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ('user', 'bus', 'notification')
+        ''')
+        missing = {'user', 'bus', 'notification'} - {row[0] for row in cur.fetchall()}
+        if missing:
+            raise click.ClickException(f"Missing table(s) {', '.join(sorted(missing))} - import database/*.sql first")
+
+        cur.execute('SET foreign_key_checks = 0, unique_checks = 0')
+        if replace:
+            for table in ['feedback_rollup', 'user_summary', 'trip', 'offline_tap', 'transaction_archive',
+                          'transaction_archive_summary', *SETTLEMENT_TABLES, 'feedback', 'notification',
+                          'transactions', 'bus', 'user']:
+                cur.execute('SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', (table,))
+                if cur.fetchone():
+                    cur.execute(f"TRUNCATE TABLE `{table}`")
+        else:
+            cur.execute('SELECT (SELECT COUNT(*) FROM user) + (SELECT COUNT(*) FROM bus)')
+            if cur.fetchone()[0]:
+                raise click.ClickException('user/bus already have rows - pass --replace to empty them first')
+
+        # End this connection's transaction first: its reads hold metadata locks on user/bus,
+        # and init_db() runs CREATE INDEX on user from another connection
+        conn.commit()
+        # Creates transactions/feedback if needed; partitions must cover the generated months before loading
+        init_db()
+        if get_transaction_partitions(cur):
+            partition_transactions_from(cur, generator.start_date.strftime('%Y-%m'))
+            ensure_transaction_partitions(cur)
+
+        for table, rows in counts.items():
+            started = time.monotonic()
+            columns = TABLE_COLUMNS[table]
+            if method == 'load-data':
+                cur.execute(f"LOAD DATA LOCAL INFILE %s INTO TABLE `{table}` ({', '.join(columns)})",
+                            (generator.path(table),))
+            else:
+                insert = f"INSERT INTO `{table}` ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+                for batch in read_rows(generator.path(table), 5000):
+                    cur.executemany(insert, batch)  # PyMySQL sends each batch as one multi-row INSERT
+            conn.commit()
+            click.echo(f"Loaded {table}: {rows:,} rows in {time.monotonic() - started:.0f}s")
+
+        for table in TABLE_COLUMNS:
+            cur.execute(f"ANALYZE TABLE `{table}`")
+            cur.fetchall()
+        cur.execute('SET foreign_key_checks = 1, unique_checks = 1')
+        generate_trips(cur, datetime.now().date(), app.config['TRIP_DAYS_AHEAD'])
+        conn.commit()
+    finally:
+        cur.close()
+        loader.close()
+    # Seeds the (now empty) feedback rollups from the loaded feedback
+    init_db()
+    invalidate_bus_cache()
+    click.echo('Done. Every generated user can log in with the --password value.')
+
+@app.cli.command('ridership-update')
+@click.option('--days', default=None, type=int, help='Closed days to fill in back from yesterday (default ANALYTICS_MAX_DAYS)')
+def ridership_update_command(days):
+    """Compute and save ridership aggregates for closed days that don't have them yet"""
+    days = days or app.config['ANALYTICS_MAX_DAYS']
+    yesterday = datetime.now().date() - timedelta(days=1)
+    computed = get_ridership_analytics().update(yesterday - timedelta(days=days - 1), yesterday)
+    click.echo(f"Computed ridership for {computed} day(s); the last {app.config['SCANNER_MAX_TAP_AGE_DAYS']} "
+               f"day(s) stay open for late scanner taps and are recomputed on demand")
+
+@app.cli.command('settle-fares')
+@click.option('--batch-size', default=None, type=int, help='Transactions per batch (default SETTLEMENT_BATCH_SIZE)')
+@click.option('--rebuild', is_flag=True, help='Empty the settlement tables and settle all live transactions again')
+def settle_fares_command(batch_size, rebuild):
+    """Settle transactions since the last run into per-bus daily totals and check wallet balances"""
+    if rebuild:
+        cur = mysql.connection.cursor()
+        try:
+            for table in SETTLEMENT_TABLES:
+                cur.execute(f"TRUNCATE TABLE `{table}`")
+        finally:
+            cur.close()
+        click.echo('Emptied settlement tables; bus totals for archived months are not rebuilt')
+    started = time.monotonic()
+    settled, mismatches = settle_transactions(batch_size, progress=click.echo)
+    click.echo(f"Settled {settled} transaction(s) in {time.monotonic() - started:.1f}s; "
+               f"{mismatches} wallet balance mismatch(es) flagged")
+
+mark_startup('register routes')
+if os.getenv('STARTUP_REPORT'):
+    print(f"Startup report: {json.dumps(get_startup_report())}")
+
 # Export handler for Vercel serverless functions
 # Vercel Python runtime expects a WSGI application
 # The handler must be the Flask app instance
@@ -0,0 +1,241 @@
+"""Seeded synthetic data for the bus_management schema, for scale testing.
+
+Writes one tab-separated file per table (the default LOAD DATA format: \\t between
+fields, \\n between rows, \\N for NULL) so app.py's `generate-dataset` command can bulk
+load them with LOAD DATA LOCAL INFILE or multi-row INSERTs.
+
+Everything is derived from the seed, and each day of transactions uses its own
+generator, so two runs with the same options produce identical files. Wallets add
+up: every user gets an opening top-up large enough that balance = credits - debits
+never ends below zero, and user.balance is that final figure.
+"""
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+FIRST_NAMES = ['Aarav', 'Aditi', 'Akash', 'Ananya', 'Arjun', 'Bhavya', 'Chetan', 'Deepa', 'Divya', 'Ganesh',
+               'Harsha', 'Ishita', 'Karthik', 'Kavya', 'Manoj', 'Meghana', 'Nikhil', 'Pooja', 'Prajwal', 'Rakshitha',
+               'Rahul', 'Sahana', 'Sanjana', 'Shreya', 'Sneha', 'Suhas', 'Tejas', 'Varun', 'Vidya', 'Yash']
+LAST_NAMES = ['Acharya', 'Bhat', 'Hegde', 'Kamath', 'Kini', 'Nayak', 'Pai', 'Poojary', 'Prabhu', 'Rao',
+              'Shenoy', 'Shetty', 'Kotian', 'Salian', 'Suvarna', 'Udupa']
+BRANCHES = ['AI', 'CS', 'EC', 'EE', 'ME', 'CV', 'IS']
+TOPUP_METHODS = ['UPI', 'Card', 'Net Banking']
+TOPUP_AMOUNTS = [100, 200, 500, 1000]
+FEEDBACK_TYPES = ['service', 'bus', 'driver', 'schedule', 'other']
+FEEDBACK_TEXT = {
+    1: 'Bus was very late and overcrowded.',
+    2: 'Frequent delays on this route.',
+    3: 'Service is okay but could be more punctual.',
+    4: 'Good service, mostly on time.',
+    5: 'Excellent service, clean bus and polite driver.'
+}
+
+# Share of each hour's boardings: morning and evening college runs dominate
+HOUR_WEIGHTS = np.array([0.1, 0.05, 0.05, 0.05, 0.1, 0.5, 3, 9, 11, 5, 2, 1.5,
+                         1.5, 1.5, 2, 3, 8, 10, 6, 2.5, 1.5, 1, 0.5, 0.2])
+WEEKDAY_WEIGHTS = np.array([1.0, 1.0, 1.0, 1.0, 1.0, 0.35, 0.1])  # Monday..Sunday
+CREDIT_SHARE = 0.12
+HOME_BUS_SHARE = 0.9
+
+# Random stream ids, so changing one table's generator never shifts another's data
+STREAM_SETUP, STREAM_DAY, STREAM_OPENING, STREAM_USERS, STREAM_NOTIFICATIONS, STREAM_FEEDBACK = range(6)
+
+TABLE_COLUMNS = {
+    'bus': ['id', 'bus_number', 'starting_point', 'ending_point', 'available_seats', 'total_seats', 'fare'],
+    'user': ['id', 'usn', 'name', 'phone', 'email', 'password', 'bus_number', 'address', 'distance', 'balance'],
+    'transactions': ['id', 'user_id', 'amount', 'transaction_type', 'description', 'bus_number', 'location', 'created_at'],
+    'notification': ['id', 'user_id', 'message', 'is_read', 'requires_response', 'response'],
+    'feedback': ['id', 'user_id', 'feedback_type', 'rating', 'feedback_text', 'created_at']
+}
+
+def format_timestamps(day, seconds):
+    stamps = np.datetime64(day, 's') + seconds.astype('timedelta64[s]')
+    return np.char.replace(stamps.astype(str), 'T', ' ').tolist()
+
+class DatasetGenerator:
+    def __init__(self, out_dir, towns, password_hash, users=50000, buses=300, transactions=20000000,
+                 days=180, end_date=None, seed=42, destination='SMVITM College'):
+        self.out_dir = out_dir
+        self.towns = list(towns)
+        self.town_distances = np.array([towns[t] for t in self.towns], dtype=np.float64)
+        self.password_hash = password_hash
+        self.n_users = users
+        self.n_buses = buses
+        self.n_transactions = transactions
+        self.days = days
+        self.end_date = end_date or date.today() - timedelta(days=1)
+        self.start_date = self.end_date - timedelta(days=days - 1)
+        self.seed = seed
+        self.destination = destination
+
+        rng = self.rng(STREAM_SETUP)
+        # Buses: spread over the towns, fare rising with distance
+        self.bus_town = np.arange(buses) % len(self.towns)
+        self.bus_fare = 15 + 5 * np.round(self.town_distances[self.bus_town] / 5)
+        self.bus_seats = rng.choice([35, 40, 45, 50, 55], size=buses)
+        # Users: a home town, the bus serving it, and how often they ride
+        self.user_town = rng.integers(len(self.towns), size=users)
+        buses_by_town = [np.flatnonzero(self.bus_town == t) for t in range(len(self.towns))]
+        self.user_bus = np.array([buses_by_town[t][rng.integers(len(buses_by_town[t]))] for t in self.user_town])
+        activity = rng.lognormal(0, 0.75, size=users)
+        self.user_cdf = np.cumsum(activity / activity.sum())
+        self.user_cdf[-1] = 1.0
+
+        day_weights = np.array([WEEKDAY_WEIGHTS[(self.start_date + timedelta(days=d)).weekday()] for d in range(days)])
+        self.day_counts = rng.multinomial(transactions, day_weights / day_weights.sum())
+        self.hour_p = HOUR_WEIGHTS / HOUR_WEIGHTS.sum()
+
+        # Each row's amount/type/description/bus/location is one of a few fixed strings
+        self.debit_fields = [
+            f"{self.bus_fare[b]:.2f}\tdebit\tBus fare payment - {self.towns[self.bus_town[b]]}\t{b + 1}\t{self.towns[self.bus_town[b]]}"
+            for b in range(buses)
+        ]
+        self.credit_fields = [
+            f"{amount:.2f}\tcredit\tTop up via {method}\tN/A\tN/A"
+            for amount in TOPUP_AMOUNTS for method in TOPUP_METHODS
+        ]
+
+    def rng(self, *stream):
+        """Independent, reproducible random stream for one part of the dataset"""
+        return np.random.default_rng([self.seed, *stream])
+
+    def path(self, table):
+        return os.path.join(self.out_dir, f"{table}.tsv")
+
+    def day_rows(self, day_index):
+        """(seconds after midnight, user index, credit flag, fields index) for one day, in time order"""
+        rng = self.rng(STREAM_DAY, day_index)
+        size = int(self.day_counts[day_index])
+        hours = rng.choice(24, size=size, p=self.hour_p)
+        seconds = np.sort(hours * 3600 + rng.integers(3600, size=size))
+        users = np.searchsorted(self.user_cdf, rng.random(size), side='right')
+        credit = rng.random(size) < CREDIT_SHARE
+        home = rng.random(size) < HOME_BUS_SHARE
+        bus = np.where(home, self.user_bus[users], rng.integers(self.n_buses, size=size))
+        credit_kind = rng.integers(len(self.credit_fields), size=size)
+        fields = np.where(credit, self.n_buses + credit_kind, bus)
+        return seconds, users, credit, fields
+
+    def fields_amounts(self):
+        credit_amounts = np.repeat(TOPUP_AMOUNTS, len(TOPUP_METHODS)).astype(np.float64)
+        return np.concatenate([-self.bus_fare, credit_amounts])
+
+    def opening_topups(self):
+        """Per-user opening credit so no wallet ends below zero (pass 1: amounts only, no formatting)"""
+        amounts = self.fields_amounts()
+        net = np.zeros(self.n_users)
+        for d in range(self.days):
+            _, users, _, fields = self.day_rows(d)
+            net += np.bincount(users, weights=amounts[fields], minlength=self.n_users)
+        rng = self.rng(STREAM_OPENING)
+        deficit = np.ceil(np.maximum(-net, 0) / 100) * 100
+        opening = deficit + rng.choice([0, 100, 200, 500], size=self.n_users)
+        return opening, net + opening
+
+    def write_transactions(self, progress=print):
+        opening, balances = self.opening_topups()
+        next_id = 1
+        with open(self.path('transactions'), 'w') as f:
+            # Opening top-ups on the first day, just after midnight
+            has_opening = np.flatnonzero(opening > 0)
+            stamps = format_timestamps(self.start_date, has_opening % 3600)
+            f.writelines(
+                f"{next_id + i}\t{u + 1}\t{opening[u]:.2f}\tcredit\tTop up via UPI\tN/A\tN/A\t{ts}\n"
+                for i, (u, ts) in enumerate(zip(has_opening.tolist(), stamps))
+            )
+            next_id += len(has_opening)
+            fields = self.debit_fields + self.credit_fields
+            for d in range(self.days):
+                seconds, users, _, kinds = self.day_rows(d)
+                day = self.start_date + timedelta(days=d)
+                stamps = format_timestamps(day, seconds)
+                f.writelines(
+                    f"{next_id + i}\t{u + 1}\t{fields[k]}\t{ts}\n"
+                    for i, (u, k, ts) in enumerate(zip(users.tolist(), kinds.tolist(), stamps))
+                )
+                next_id += len(users)
+                if d % 30 == 29 or d == self.days - 1:
+                    progress(f"  transactions: {next_id - 1:,} rows through {day}")
+        return next_id - 1, balances
+
+    def write_buses(self):
+        with open(self.path('bus'), 'w') as f:
+            for b in range(self.n_buses):
+                seats = int(self.bus_seats[b])
+                f.write(f"{b + 1}\t{b + 1}\t{self.towns[self.bus_town[b]]}\t{self.destination}\t{seats}\t{seats}\t{self.bus_fare[b]:.2f}\n")
+        return self.n_buses
+
+    def write_users(self, balances):
+        rng = self.rng(STREAM_USERS)
+        first = rng.integers(len(FIRST_NAMES), size=self.n_users)
+        last = rng.integers(len(LAST_NAMES), size=self.n_users)
+        branch = rng.integers(len(BRANCHES), size=self.n_users)
+        year = rng.integers(21, 25, size=self.n_users)
+        phone = rng.integers(6000000000, 9999999999, size=self.n_users)
+        with open(self.path('user'), 'w') as f:
+            for i in range(self.n_users):
+                town = self.towns[self.user_town[i]]
+                first_name, last_name = FIRST_NAMES[first[i]], LAST_NAMES[last[i]]
+                f.write(f"{i + 1}\t4MW{year[i]}{BRANCHES[branch[i]]}{i + 1:05d}\t{first_name} {last_name}\t{phone[i]}\t"
+                        f"{first_name.lower()}.{last_name.lower()}{i + 1}@example.edu\t{self.password_hash}\t"
+                        f"{self.user_bus[i] + 1}\t{i % 200 + 1}, Main Road, {town}\t{self.town_distances[self.user_town[i]]:g}\t"
+                        f"{balances[i]:.2f}\n")
+        return self.n_users
+
+    def write_notifications(self):
+        rng = self.rng(STREAM_NOTIFICATIONS)
+        counts = rng.poisson(2, size=self.n_users)
+        rows = 0
+        with open(self.path('notification'), 'w') as f:
+            for u in np.flatnonzero(counts).tolist():
+                for _ in range(int(counts[u])):
+                    rows += 1
+                    answered = rng.random() < 0.7
+                    response = ('yes' if rng.random() < 0.85 else 'no') if answered else '\\N'
+                    f.write(f"{rows}\t{u + 1}\tWill you be boarding Bus {self.user_bus[u] + 1} today?\t"
+                            f"{int(answered or rng.random() < 0.3)}\t1\t{response}\n")
+        return rows
+
+    def write_feedback(self):
+        rng = self.rng(STREAM_FEEDBACK)
+        authors = np.flatnonzero(rng.random(self.n_users) < 0.15)
+        counts = rng.integers(1, 4, size=len(authors))
+        rows = 0
+        span = self.days * 86400
+        with open(self.path('feedback'), 'w') as f:
+            for u, count in zip(authors.tolist(), counts.tolist()):
+                for _ in range(count):
+                    rows += 1
+                    rating = int(rng.choice(5, p=[0.05, 0.08, 0.2, 0.37, 0.3])) + 1
+                    created = datetime.combine(self.start_date, datetime.min.time()) + timedelta(seconds=int(rng.integers(span)))
+                    f.write(f"{rows}\t{u + 1}\t{FEEDBACK_TYPES[rng.integers(len(FEEDBACK_TYPES))]}\t{rating}\t"
+                            f"{FEEDBACK_TEXT[rating]}\t{created:%Y-%m-%d %H:%M:%S}\n")
+        return rows
+
+    def generate(self, progress=print):
+        """Write every table's file; returns {table: row count} in load order"""
+        os.makedirs(self.out_dir, exist_ok=True)
+        counts = {'bus': self.write_buses()}
+        progress(f"  bus: {counts['bus']:,} rows")
+        transactions, balances = self.write_transactions(progress)
+        counts['user'] = self.write_users(balances)
+        progress(f"  user: {counts['user']:,} rows")
+        counts['transactions'] = transactions
+        counts['notification'] = self.write_notifications()
+        progress(f"  notification: {counts['notification']:,} rows")
+        counts['feedback'] = self.write_feedback()
+        progress(f"  feedback: {counts['feedback']:,} rows")
+        return counts
+
+def read_rows(path, batch_size):
+    """Batches of tuples from a generated file, with \\N turned back into None"""
+    batch = []
+    with open(path) as f:
+        for line in f:
+            batch.append(tuple(None if v == '\\N' else v for v in line.rstrip('\n').split('\t')))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,100 @@
+"""Measure cold-start cost: fresh interpreter -> import app -> first response.
+
+Every run starts a new Python process (like a new serverless instance), imports
+app.py and serves one request through Flask's test client, so no network or MySQL
+server is needed for pages that do not touch the database.
+
+    python scripts/bench_coldstart.py                 # 10 runs against /
+    python scripts/bench_coldstart.py --path /startup-report --runs 20
+    python scripts/bench_coldstart.py --importtime    # also show the slowest imports
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get(sys.argv[1])
+response.get_data()
+done = time.perf_counter()
+report = app.get_startup_report()
+print(json.dumps({
+    'status': response.status_code,
+    'import_ms': (imported - started) * 1000,
+    'first_response_ms': (done - imported) * 1000,
+    'stages': report['stages'],
+    'qr_stack_loaded': report['qr_stack_loaded'],
+}))
+'''
+
+def run_once(path, env):
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', CHILD, path], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['process_ms'] = wall_ms
+    return result
+
+def import_times(env, top):
+    """Run `python -X importtime -c 'import app'` and summarise it"""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+
+    direct = [r for r in rows if r[1] == 1]
+    print(f"\nSlowest top-level imports (cumulative, top {top}):")
+    for name, _, _, cumulative in sorted(direct, key=lambda r: -r[3])[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    print(f"\nSlowest modules by self time (top {top}):")
+    for name, _, self_us, _ in sorted(rows, key=lambda r: -r[2])[:top]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+def summary(label, values):
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    print(f"  {label:<20} median {statistics.median(values):8.1f} ms   p95 {p95:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default='/', help='first request path')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--importtime', action='store_true', help='print an -X importtime summary')
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('FLASK_ENV', 'development')
+    results = [run_once(args.path, env) for _ in range(args.runs)]
+
+    print(f"Cold starts: {args.runs} fresh processes, first request GET {args.path} "
+          f"(status {results[-1]['status']})")
+    summary('process wall time', [r['process_ms'] for r in results])
+    summary('import app', [r['import_ms'] for r in results])
+    summary('first response', [r['first_response_ms'] for r in results])
+    print(f"  QR stack loaded: {results[-1]['qr_stack_loaded']}")
+
+    print("\nModule load stages (median ms):")
+    for i, stage in enumerate(results[0]['stages']):
+        print(f"  {statistics.median(r['stages'][i]['ms'] for r in results):8.1f} ms  {stage['stage']}")
+
+    if args.importtime:
+        import_times(env, args.top)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Fire the same concurrent load at a running server and report throughput and latency.
+
+Use it to compare the sync WSGI deployment with the ASGI mode under identical load:
+
+    gunicorn app:app --workers 2 --bind :8000 &
+    python scripts/bench_serving.py http://localhost:8000 --usn 4MW23AI090 --password secret
+
+    uvicorn asgi:asgi_app --workers 2 --port 8001 &
+    python scripts/bench_serving.py http://localhost:8001 --usn 4MW23AI090 --password secret
+
+Each client logs in once, then cycles through the I/O-bound pages.
+
+Without a MySQL server, serve the stand-in apps below instead. They add /bench/io, which
+waits 20 ms three times like a page making three queries to a remote database:
+
+    gunicorn --pythonpath scripts 'bench_serving:standin_app()' --workers 2 --bind :8000 &
+    uvicorn --app-dir scripts --factory bench_serving:standin_asgi_app --workers 2 --port 8001 &
+    python scripts/bench_serving.py http://localhost:8000 --path /bench/io
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+PATHS = ['/dashboard', '/view_transactions', '/notification', '/view_bus_location']
+
+STANDIN_WAITS = 3
+STANDIN_WAIT_S = 0.02
+
+def standin_app():
+    """The Flask app plus /bench/io, a database-free stand-in for an I/O-bound page"""
+    os.environ.setdefault('FLASK_ENV', 'development')
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import app as app_module
+
+    def bench_io():
+        for _ in range(STANDIN_WAITS):
+            time.sleep(STANDIN_WAIT_S)
+        return 'ok'
+    app_module.ensure_db_initialized = lambda: None  # there is no database behind the stand-in
+    app_module.app.add_url_rule('/bench/io', 'bench_io', bench_io)
+    return app_module.app
+
+def standin_asgi_app():
+    standin_app()
+    from asgi import asgi_app
+    return asgi_app
+
+def make_client(base_url, usn, password):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    if usn:
+        data = urllib.parse.urlencode({'usn': usn, 'password': password}).encode()
+        opener.open(base_url + '/login', data=data, timeout=30).read()
+    return opener
+
+def worker(base_url, args, deadline, latencies, errors, lock):
+    opener = make_client(base_url, args.usn, args.password)
+    i = 0
+    while time.monotonic() < deadline:
+        path = args.paths[i % len(args.paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            opener.open(base_url + path, timeout=30).read()
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+        except (urllib.error.URLError, OSError):
+            with lock:
+                errors[0] += 1
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base_url')
+    parser.add_argument('--usn', help='USN to log in as (pages redirect to /login otherwise)')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--path', dest='paths', action='append', help=f"page to request, repeatable (default {' '.join(PATHS)})")
+    args = parser.parse_args()
+    args.paths = args.paths or PATHS
+
+    base_url = args.base_url.rstrip('/')
+    latencies, errors, lock = [], [0], threading.Lock()
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(base_url, args, deadline, latencies, errors, lock))
+        for _ in range(args.concurrency)
+    ]
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    print(f"target:      {base_url}")
+    print(f"concurrency: {args.concurrency}, duration: {elapsed:.1f}s")
+    print(f"requests:    {len(latencies)} ok, {errors[0]} failed")
+    print(f"throughput:  {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        print(f"latency ms:  mean {statistics.mean(latencies) * 1000:.1f}, "
+              f"p50 {percentile(latencies, 50) * 1000:.1f}, "
+              f"p95 {percentile(latencies, 95) * 1000:.1f}, "
+              f"p99 {percentile(latencies, 99) * 1000:.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Build fingerprinted, precompressed copies of everything under static/.
+
+For every source asset this writes static/dist/<dir>/<name>.<hash>.<ext>, where the
+hash is taken from the file contents, plus:
+  - PNG/JPEG: a losslessly re-optimized copy and a .webp variant (Pillow)
+  - CSS/JS/SVG/JSON: .gz and, if the `brotli` package is installed, .br siblings
+and records the mapping in static/dist/manifest.json. app.py reads the manifest at
+start-up, emits the fingerprinted URLs from url_for('static', ...) and serves them
+with a one-year immutable Cache-Control.
+
+Run it before deploying (and after changing anything in static/):
+    python scripts/build_assets.py
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+TEXT_EXTENSIONS = {'.css', '.js', '.svg', '.json'}
+WEBP_QUALITY = 80
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def optimize_image(data, ext):
+    """Return (optimized_bytes, webp_bytes) - either may be None if Pillow can't help"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None, None
+    with Image.open(BytesIO(data)) as image:
+        image.load()
+        optimized = BytesIO()
+        if ext == '.png':
+            image.save(optimized, 'PNG', optimize=True)
+        else:
+            image.save(optimized, 'JPEG', optimize=True, progressive=True, quality=85)
+        webp = BytesIO()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        image.save(webp, 'WEBP', quality=WEBP_QUALITY, method=6)
+    optimized = optimized.getvalue()
+    return (optimized if len(optimized) < len(data) else None), webp.getvalue()
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def build():
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    manifest = {}
+    before = after = 0
+
+    for dirpath, dirnames, filenames in os.walk(STATIC_DIR):
+        dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != DIST_DIR]
+        for filename in sorted(filenames):
+            source = os.path.join(dirpath, filename)
+            logical = os.path.relpath(source, STATIC_DIR).replace(os.sep, '/')
+            stem, ext = os.path.splitext(logical)
+            ext = ext.lower()
+            with open(source, 'rb') as f:
+                data = f.read()
+
+            entry = {}
+            if ext in IMAGE_EXTENSIONS:
+                optimized, webp = optimize_image(data, ext)
+                if optimized:
+                    data = optimized
+                if webp and len(webp) < len(data):
+                    webp_name = f"dist/{stem}.{content_hash(webp)}.webp"
+                    write(os.path.join(STATIC_DIR, webp_name), webp)
+                    entry['webp'] = webp_name
+
+            fingerprinted = f"dist/{stem}.{content_hash(data)}{ext}"
+            target = os.path.join(STATIC_DIR, fingerprinted)
+            write(target, data)
+            entry['file'] = fingerprinted
+
+            if ext in TEXT_EXTENSIONS:
+                write(target + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+                entry['gzip'] = True
+                if brotli is not None:
+                    write(target + '.br', brotli.compress(data, quality=11))
+                    entry['br'] = True
+
+            manifest[logical] = entry
+            before += os.path.getsize(source)
+            after += len(data)
+            sizes = f"{os.path.getsize(source) / 1024:.1f} KB -> {len(data) / 1024:.1f} KB"
+            if 'webp' in entry:
+                sizes += f" (webp {os.path.getsize(os.path.join(STATIC_DIR, entry['webp'])) / 1024:.1f} KB)"
+            print(f"  {logical:<28} {entry['file']:<44} {sizes}")
+
+    write(os.path.join(DIST_DIR, 'manifest.json'), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    print(f"Wrote {len(manifest)} assets to static/dist ({before / 1024:.0f} KB -> {after / 1024:.0f} KB)")
+    if brotli is None:
+        print("Note: install `brotli` to also write .br files", file=sys.stderr)
+
+if __name__ == '__main__':
+    build()
@@ -0,0 +1,68 @@
+import pytest
+
+from app import UserListing, decode_page_token, encode_page_token, fetch_admin_page, like_prefix
+
+class RecordingCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.query = None
+        self.params = None
+
+    def execute(self, query, params=()):
+        self.query = ' '.join(query.split())
+        self.params = list(params)
+
+    def fetchall(self):
+        return self.rows
+
+def user(id, name):
+    return (id, f"4MW{id:03d}", name, '9999999999', f"{name.lower()}@example.com", '1', 100)
+
+def test_page_token_round_trip():
+    row = UserListing._make(user(7, 'Asha'))
+    assert decode_page_token(encode_page_token(row, 'name', 'id')) == ['Asha', 7]
+
+@pytest.mark.parametrize('token', ['bm90IGpzb24', 'WzFd', 'eyJhIjogMX0='])
+def test_page_token_rejects_garbage(token):
+    with pytest.raises(ValueError):
+        decode_page_token(token)
+
+def test_like_prefix_escapes_wildcards():
+    assert like_prefix('50%_a\\') == '50\\%\\_a\\\\%'
+
+def test_first_page_has_no_seek_and_fetches_one_extra():
+    cur = RecordingCursor([user(i, f"N{i}") for i in range(1, 4)])
+    rows, more_after, more_before = fetch_admin_page(cur, 'user', 'name', False, 2)
+    assert 'WHERE' not in cur.query
+    assert cur.query.endswith('ORDER BY `name` ASC, `id` ASC LIMIT %s')
+    assert cur.params == [3]
+    assert [r.id for r in rows] == [1, 2]
+    assert (more_after, more_before) == (True, False)
+
+def test_next_page_seeks_past_sort_and_key():
+    cur = RecordingCursor([user(5, 'Ravi')])
+    rows, more_after, more_before = fetch_admin_page(cur, 'user', 'name', False, 2, after=['Priya', 4])
+    assert '(`name` > %s OR (`name` = %s AND `id` > %s))' in cur.query
+    assert cur.params == ['Priya', 'Priya', 4, 3]
+    assert (more_after, more_before) == (False, True)
+
+def test_descending_on_key_uses_single_comparison():
+    cur = RecordingCursor([])
+    fetch_admin_page(cur, 'user', 'id', True, 10, after=[40, 40])
+    assert 'WHERE `id` < %s' in cur.query
+    assert cur.query.endswith('ORDER BY `id` DESC LIMIT %s')
+    assert cur.params == [40, 11]
+
+def test_previous_page_walks_backwards_and_restores_order():
+    cur = RecordingCursor([user(3, 'C'), user(2, 'B'), user(1, 'A')])
+    rows, more_after, more_before = fetch_admin_page(cur, 'user', 'name', False, 2, before=['D', 4])
+    assert '(`name` < %s OR (`name` = %s AND `id` < %s))' in cur.query
+    assert 'ORDER BY `name` DESC, `id` DESC' in cur.query
+    assert [r.name for r in rows] == ['B', 'C']
+    assert (more_after, more_before) == (True, True)
+
+def test_search_and_user_filter_are_combined():
+    cur = RecordingCursor([])
+    fetch_admin_page(cur, 'transactions', 'id', True, 5, field='description', prefix='Bus', user_id=9)
+    assert 'WHERE `description` LIKE %s AND user_id = %s' in cur.query
+    assert cur.params == ['Bus%', 9, 6]
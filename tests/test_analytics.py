@@ -0,0 +1,74 @@
+import os
+from datetime import date, timedelta
+
+import pytest
+
+pytest.importorskip('numpy')
+from analytics import RidershipAnalytics
+
+class Cursor:
+    def __init__(self, calls):
+        self.calls = calls
+        self.rows = None
+
+    def execute(self, query, params):
+        self.calls.append(params[0])
+        self.rows = [('12', 'Udupi', 8, 20.0), ('12', 'Manipal', 17, 20.0)]
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def calls():
+    return []
+
+@pytest.fixture
+def analytics(tmp_path, calls):
+    return RidershipAnalytics(lambda: Cursor(calls), str(tmp_path), today_ttl=60, open_days=7)
+
+def saved(analytics):
+    return sorted(os.listdir(analytics.cache_dir))
+
+def test_days_open_to_late_taps_are_not_saved(analytics, calls):
+    today = date.today()
+    analytics.daily(today - timedelta(days=7))
+    analytics.daily(today - timedelta(days=8))
+    assert saved(analytics) == [f"{today - timedelta(days=8)}.json"]
+    # Open days are still cached briefly
+    analytics.daily(today - timedelta(days=7))
+    assert len(calls) == 2
+
+def test_update_skips_open_days_unless_final(analytics):
+    today = date.today()
+    since = today - timedelta(days=10)
+    assert analytics.update(since) == 3
+    assert analytics.update(since) == 0
+    assert analytics.update(since, today - timedelta(days=1), final=True) == 7
+    assert len(saved(analytics)) == 10
+
+def test_report_counts_boardings_and_revenue(analytics):
+    day = date.today() - timedelta(days=20)
+    report = analytics.build_report(day, day, [analytics.daily(day)], {'12': 'Udupi - College'})
+    assert report['total_boardings'] == 2
+    assert report['buses']['12']['revenue'] == 40.0
+    assert report['revenue_by_route'] == {'Udupi - College': 40.0}
+
+def test_archived_days_are_not_saved_as_zeros(tmp_path, calls):
+    today = date.today()
+    analytics = RidershipAnalytics(lambda: Cursor(calls), str(tmp_path), open_days=7,
+                                   live_since=lambda: today - timedelta(days=20))
+    assert analytics.daily(today - timedelta(days=25)).buses == []
+    assert analytics.update(today - timedelta(days=30), today - timedelta(days=15)) == 6
+    assert saved(analytics) == [f"{today - timedelta(days=n)}.json" for n in range(20, 14, -1)]
+    assert len(calls) == 6
+
+def test_report_cache_is_bounded(tmp_path, calls):
+    analytics = RidershipAnalytics(lambda: Cursor(calls), str(tmp_path), open_days=7, max_reports=3)
+    end = date.today() - timedelta(days=10)
+    for n in range(5):
+        analytics.report_json(end - timedelta(days=n), end)
+    assert list(analytics._reports) == [(end - timedelta(days=n), end) for n in (2, 3, 4)]
@@ -0,0 +1,58 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from app import (ArchiveBucketWriter, add_months, app, archive_bucket_path, archive_index_cache,
+                 read_archived_transactions)
+
+def row(id, user_id, day):
+    return json.dumps({
+        'id': id, 'user_id': user_id, 'amount': '20.00', 'transaction_type': 'debit',
+        'description': 'Bus fare payment - Udupi', 'bus_number': '12', 'location': 'Udupi',
+        'created_at': f"2025-01-{day:02d}T08:00:00"
+    }) + '\n'
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'ARCHIVE_DIR', str(tmp_path))
+    monkeypatch.setitem(app.config, 'ARCHIVE_BUCKETS', 2)
+    archive_index_cache.clear()
+    os.makedirs(tmp_path / 'transactions' / '2025-01')
+    return tmp_path
+
+def write_bucket(rows):
+    path = archive_bucket_path('2025-01', rows[0][1])
+    writer = ArchiveBucketWriter(path)
+    for id, user_id, day in rows:
+        writer.write(user_id, row(id, user_id, day))
+    writer.close()
+    return path
+
+def test_reads_only_the_users_rows_newest_first(archive_dir):
+    write_bucket([(1, 2, 3), (2, 2, 5), (3, 4, 1), (4, 6, 2), (5, 6, 9)])
+    assert [t.id for t in read_archived_transactions(2, '2025-01')] == [2, 1]
+    assert [t.id for t in read_archived_transactions(6, '2025-01')] == [5, 4]
+    assert read_archived_transactions(8, '2025-01') == []
+
+def test_bucket_is_still_one_readable_gzip_file(archive_dir):
+    path = write_bucket([(1, 2, 3), (3, 4, 1)])
+    with gzip.open(path, 'rt') as f:
+        assert [json.loads(line)['id'] for line in f] == [1, 3]
+
+def test_falls_back_to_scanning_buckets_without_an_index(archive_dir):
+    path = write_bucket([(1, 2, 3), (3, 4, 1)])
+    os.remove(path[:-len('.ndjson.gz')] + '.index.json')
+    assert [t.id for t in read_archived_transactions(4, '2025-01')] == [3]
+
+@pytest.mark.parametrize('month_key, count, expected', [
+    ('2025-01', 1, '2025-02'),
+    ('2025-12', 1, '2026-01'),
+    ('2025-01', -1, '2024-12'),
+    ('2025-03', -14, '2024-01'),
+    ('2025-06', 0, '2025-06'),
+    ('2025-11', 26, '2028-01'),
+])
+def test_add_months(month_key, count, expected):
+    assert add_months(month_key, count) == expected
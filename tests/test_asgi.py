@@ -0,0 +1,42 @@
+from asgi import build_environ
+
+def scope(**overrides):
+    scope = {
+        'type': 'http', 'http_version': '1.1', 'method': 'GET', 'scheme': 'https',
+        'path': '/view_transactions', 'root_path': '', 'query_string': b'page=2',
+        'server': ('bus.example.com', 443), 'client': ('10.0.0.7', 51000), 'headers': []
+    }
+    scope.update(overrides)
+    return scope
+
+def test_request_line_and_addresses():
+    environ = build_environ(scope(), b'')
+    assert environ['REQUEST_METHOD'] == 'GET'
+    assert environ['PATH_INFO'] == '/view_transactions'
+    assert environ['QUERY_STRING'] == 'page=2'
+    assert (environ['SERVER_NAME'], environ['SERVER_PORT']) == ('bus.example.com', '443')
+    assert environ['REMOTE_ADDR'] == '10.0.0.7'
+    assert environ['wsgi.url_scheme'] == 'https'
+
+def test_body_and_content_headers():
+    environ = build_environ(scope(method='POST', headers=[
+        (b'content-type', b'application/x-www-form-urlencoded'), (b'content-length', b'9')
+    ]), b'usn=4MW23')
+    assert environ['CONTENT_TYPE'] == 'application/x-www-form-urlencoded'
+    assert environ['CONTENT_LENGTH'] == '9'
+    assert 'HTTP_CONTENT_TYPE' not in environ
+    assert environ['wsgi.input'].read() == b'usn=4MW23'
+
+def test_repeated_headers_are_joined():
+    environ = build_environ(scope(headers=[
+        (b'accept', b'text/html'), (b'accept', b'application/json'),
+        (b'cookie', b'session=abc'), (b'cookie', b'theme=dark'), (b'x-forwarded-for', b'1.2.3.4')
+    ]), b'')
+    assert environ['HTTP_ACCEPT'] == 'text/html,application/json'
+    assert environ['HTTP_COOKIE'] == 'session=abc; theme=dark'
+    assert environ['HTTP_X_FORWARDED_FOR'] == '1.2.3.4'
+
+def test_non_ascii_path_is_latin1_encoded_utf8():
+    environ = build_environ(scope(path='/bus/Udupi–Manipal', server=None, client=None), b'')
+    assert environ['PATH_INFO'].encode('latin1').decode('utf8') == '/bus/Udupi–Manipal'
+    assert (environ['SERVER_NAME'], environ['SERVER_PORT']) == ('localhost', '80')
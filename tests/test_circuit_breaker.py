@@ -0,0 +1,99 @@
+import pytest
+
+import app as app_module
+from app import CircuitBreaker, CircuitOpenError
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(app_module.time, 'monotonic', clock)
+    return clock
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(failure_threshold=3, reset_timeout=5, max_reset_timeout=20)
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.allow()
+        breaker.record_failure(OSError('connection refused'))
+
+def test_stays_closed_below_threshold(breaker):
+    breaker.record_failure(OSError('boom'))
+    breaker.record_failure(OSError('boom'))
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.allow()
+
+def test_success_resets_failure_count(breaker):
+    breaker.record_failure(OSError('boom'))
+    breaker.record_failure(OSError('boom'))
+    breaker.record_success()
+    breaker.record_failure(OSError('boom'))
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 1
+
+def test_opens_after_threshold_and_rejects(breaker):
+    trip(breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    assert breaker.status()['last_error'] == 'connection refused'
+
+def test_lets_one_probe_through_after_timeout(breaker, clock):
+    trip(breaker)
+    clock.now += 5
+    assert not breaker.is_open()
+    breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Everyone else waits for the probe's result
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+def test_successful_probe_closes(breaker, clock):
+    trip(breaker)
+    clock.now += 5
+    breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.reset_timeout == 5
+    breaker.allow()
+
+def test_failed_probe_doubles_backoff_up_to_max(breaker, clock):
+    trip(breaker)
+    for expected in (10, 20, 20):
+        clock.now += breaker.reset_timeout
+        breaker.allow()
+        breaker.record_failure(OSError('still down'))
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.reset_timeout == expected
+        clock.now += expected - 1
+        with pytest.raises(CircuitOpenError):
+            breaker.allow()
+        clock.now -= expected - 1
+
+def test_backoff_resets_after_recovery(breaker, clock):
+    trip(breaker)
+    clock.now += 5
+    breaker.allow()
+    breaker.record_failure(OSError('still down'))
+    clock.now += 10
+    breaker.allow()
+    breaker.record_success()
+    trip(breaker)
+    assert breaker.reset_timeout == 5
+
+@pytest.mark.parametrize('retry_in_s, expected', [(4.2, '5'), (0.4, '1'), (0.0, '1')])
+def test_retry_after_rounds_up(monkeypatch, retry_in_s, expected):
+    monkeypatch.setattr(app_module.db_breaker, 'status', lambda: {'retry_in_s': retry_in_s})
+    with app_module.app.test_request_context('/dashboard'):
+        _, status, headers = app_module.degraded_response()
+    assert status == 503
+    assert headers['Retry-After'] == expected
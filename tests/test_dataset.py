@@ -0,0 +1,48 @@
+from collections import defaultdict
+from datetime import date, datetime
+
+import pytest
+
+pytest.importorskip('numpy')
+from dataset import TABLE_COLUMNS, DatasetGenerator, read_rows
+
+TOWNS = {'Udupi': 8, 'Manipal': 12, 'Kaup': 15}
+
+def generate(out_dir, seed=7):
+    generator = DatasetGenerator(str(out_dir), TOWNS, 'hash', users=40, buses=6, transactions=2000, days=10,
+                                 end_date=date(2025, 3, 31), seed=seed)
+    return generator, generator.generate(progress=lambda message: None)
+
+def rows(generator, table):
+    return [row for batch in read_rows(generator.path(table), 500) for row in batch]
+
+def test_counts_and_columns(tmp_path):
+    generator, counts = generate(tmp_path)
+    assert list(counts) == ['bus', 'user', 'transactions', 'notification', 'feedback']
+    assert counts['bus'] == 6 and counts['user'] == 40
+    # The opening top-ups come on top of the requested transactions
+    assert counts['transactions'] > 2000
+    for table, count in counts.items():
+        table_rows = rows(generator, table)
+        assert len(table_rows) == count
+        assert {len(row) for row in table_rows} == {len(TABLE_COLUMNS[table])}
+
+def test_same_seed_same_files(tmp_path):
+    first, _ = generate(tmp_path / 'a')
+    second, _ = generate(tmp_path / 'b')
+    other, _ = generate(tmp_path / 'c', seed=8)
+    for table in TABLE_COLUMNS:
+        with open(first.path(table)) as a, open(second.path(table)) as b:
+            assert a.read() == b.read()
+    assert rows(first, 'transactions') != rows(other, 'transactions')
+
+def test_wallets_add_up_and_never_end_negative(tmp_path):
+    generator, _ = generate(tmp_path)
+    running = defaultdict(float)
+    for row in rows(generator, 'transactions'):
+        user_id, amount, kind, created_at = row[1], float(row[2]), row[3], row[7]
+        running[user_id] += amount if kind == 'credit' else -amount
+        assert generator.start_date <= datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S').date() <= generator.end_date
+    for row in rows(generator, 'user'):
+        assert float(row[9]) == pytest.approx(running[row[0]], abs=0.01)
+        assert float(row[9]) >= 0
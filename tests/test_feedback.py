@@ -0,0 +1,71 @@
+import pymysql
+import pytest
+
+from app import FeedbackIngestor, app, write_feedback_batch
+
+class RecordingCursor:
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.calls = []
+
+    def executemany(self, query, rows):
+        if 'INSERT INTO feedback ' in query and any(row[1] == self.fail_on for row in rows):
+            raise pymysql.err.DataError(1265, 'Data truncated')
+        self.calls.append((query, rows))
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+
+    def cursor(self):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+@pytest.fixture
+def ingestor(monkeypatch):
+    ingestor = FeedbackIngestor(app)
+    monkeypatch.setattr(ingestor.db, 'rollback', lambda: None)
+    return ingestor
+
+def test_rollup_counts_type_and_bus():
+    cur = RecordingCursor()
+    deltas = write_feedback_batch(cur, [
+        (1, 'driver', 5, 'great', '12'),
+        (2, 'driver', 3, 'ok', None),
+        (3, 'bus', 1, 'broken seat', '12'),
+    ])
+    assert deltas[('type', 'driver')] == {'count': 2, 'sum': 8, 'histogram': [0, 0, 1, 0, 1]}
+    assert deltas[('bus', '12')] == {'count': 2, 'sum': 6, 'histogram': [1, 0, 0, 0, 1]}
+    assert ('bus', None) not in deltas
+    assert len(cur.calls[0][1]) == 3
+
+def test_queue_batches_up_to_batch_size(ingestor):
+    ingestor.batch_size = 2
+    for n in range(3):
+        ingestor.queue.put_nowait((n, 'other', 4, '', None))
+    assert len(ingestor._take_batch(0)) == 2
+    assert len(ingestor._take_batch(0)) == 1
+    assert ingestor._take_batch(0) == []
+
+def test_bad_row_falls_back_to_row_by_row(ingestor, monkeypatch):
+    conn = FakeConnection(RecordingCursor(fail_on='bogus'))
+    monkeypatch.setattr(ingestor.db, 'get_connection', lambda: conn)
+    assert not ingestor.flush([(1, 'service', 4, '', None), (2, 'bogus', 2, '', None)])
+    assert conn.commits == 1
+    assert ingestor.snapshot() == {('type', 'service'): {'count': 1, 'sum': 4, 'histogram': [0, 0, 0, 1, 0]}}
+
+def test_no_sleep_after_last_attempt(ingestor, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('app.time.sleep', sleeps.append)
+
+    def unavailable():
+        raise pymysql.err.OperationalError(2003, "Can't connect")
+    monkeypatch.setattr(ingestor.db, 'get_connection', unavailable)
+    assert not ingestor.flush([(1, 'other', 3, '', None)], retries=3)
+    assert sleeps == [1, 2]
@@ -0,0 +1,64 @@
+import threading
+
+import pymysql
+import pytest
+
+from app import Replica, ReadConnectionWrapper, app
+
+class FailingCursor:
+    def __init__(self, code):
+        self.code = code
+
+    def execute(self, query):
+        raise pymysql.err.OperationalError(self.code, 'error')
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    def __init__(self, code):
+        self.code = code
+
+    def cursor(self):
+        return FailingCursor(self.code)
+
+@pytest.fixture
+def replica():
+    return Replica(app, '127.0.0.1:3307')
+
+def test_missing_privilege_keeps_replica_with_unknown_lag(replica):
+    replica.db.get_connection = lambda: FakeConnection(Replica.ACCESS_DENIED)
+    replica.check()
+    assert replica.healthy
+    assert replica.lag is None
+    assert 'REPLICATION CLIENT' in replica.error
+
+def test_other_errors_eject_replica(replica):
+    replica.db.get_connection = lambda: FakeConnection(2003)
+    replica.check()
+    assert not replica.healthy
+
+def test_availability_check_runs_off_the_request_thread(replica, monkeypatch):
+    answered, checked = threading.Event(), threading.Event()
+    threads = []
+
+    def check():
+        answered.wait(1)
+        threads.append(threading.current_thread())
+        replica.healthy = False
+        checked.set()
+    monkeypatch.setattr(replica, 'check', check)
+    monkeypatch.setattr(replica, 'check_interval', 60)
+    assert replica.is_available()  # last known value, without waiting for the check
+    answered.set()
+    assert checked.wait(1)
+    assert threads[0] is not threading.current_thread()
+    assert not replica.is_available()
+    assert len(threads) == 1
+
+def test_round_robin_over_available_replicas(monkeypatch):
+    first, second = Replica(app, 'a:3306'), Replica(app, 'b:3306')
+    for r in (first, second):
+        monkeypatch.setattr(r, 'is_available', lambda: True)
+    wrapper = ReadConnectionWrapper(None, [first, second])
+    assert [wrapper.pick() for _ in range(4)] == [first, second, first, second]
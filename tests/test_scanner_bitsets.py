@@ -0,0 +1,27 @@
+from app import bitset_changes, build_eligibility_bitset
+
+def ids(bits):
+    return {i for i in range(len(bits) * 8) if bits[i >> 3] >> (i & 7) & 1}
+
+def test_bitset_marks_users_who_can_pay():
+    bits = build_eligibility_bitset([(1, 50), (2, 10), (9, 20), (17, None)], fare=20)
+    assert ids(bits) == {1, 9}
+    assert len(bits) == 17 // 8 + 1
+
+def test_empty_bitset():
+    assert build_eligibility_bitset([], fare=20) == b'\0'
+
+def test_changes_between_bitsets():
+    old = build_eligibility_bitset([(1, 50), (2, 50), (9, 50)], fare=20)
+    new = build_eligibility_bitset([(1, 50), (2, 0), (12, 50)], fare=20)
+    assert bitset_changes(old, new) == ([12], [2, 9])
+
+def test_changes_when_bitset_grows_or_shrinks():
+    small = build_eligibility_bitset([(3, 50)], fare=20)
+    large = build_eligibility_bitset([(3, 50), (40, 50)], fare=20)
+    assert bitset_changes(small, large) == ([40], [])
+    assert bitset_changes(large, small) == ([], [40])
+
+def test_no_changes():
+    bits = build_eligibility_bitset([(1, 50), (30, 50)], fare=20)
+    assert bitset_changes(bits, bits) == ([], [])
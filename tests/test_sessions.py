@@ -0,0 +1,62 @@
+import time
+
+import pytest
+from flask import session
+
+import app as app_module
+from app import MemorySessionBackend, SQLiteSessionBackend, app, regenerate_session
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemorySessionBackend(maxsize=3)
+    return SQLiteSessionBackend(str(tmp_path / 'sessions.sqlite3'))
+
+def test_save_and_get(backend):
+    backend.save('a', {'user_id': 5, 'usn': '4MW23AI090'}, 5, 60)
+    data, expires_at = backend.get('a')
+    assert data == {'user_id': 5, 'usn': '4MW23AI090'}
+    assert time.time() < expires_at <= time.time() + 60
+    assert backend.get('missing') is None
+
+def test_expired_sessions_are_gone(backend):
+    backend.save('a', {'user_id': 5}, 5, -1)
+    assert backend.get('a') is None
+
+def test_touch_extends_expiry(backend):
+    backend.save('a', {'user_id': 5}, 5, 10)
+    backend.touch('a', 3600)
+    assert backend.get('a')[1] > time.time() + 3000
+    assert backend.get('a')[0] == {'user_id': 5}
+
+def test_revoke_user_removes_all_their_sessions(backend):
+    backend.save('a', {'user_id': 5}, 5, 60)
+    backend.save('b', {'user_id': 5}, 5, 60)
+    backend.save('c', {'user_id': 6}, 6, 60)
+    assert backend.revoke_user(5) == 2
+    assert backend.get('a') is None and backend.get('b') is None
+    assert backend.get('c') is not None
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemorySessionBackend(maxsize=2)
+    backend.save('a', {}, 1, 60)
+    backend.save('b', {}, 1, 60)
+    backend.get('a')
+    backend.save('c', {}, 1, 60)
+    assert backend.get('b') is None
+    assert backend.get('a') is not None
+    assert backend.revoke_user(1) == 2
+
+def test_regenerate_session_moves_data_to_a_new_id():
+    backend = app_module.session_backend
+    backend.save('planted-sid', {'theme': 'dark'}, None, 60)
+    with app.test_request_context('/login', headers={'Cookie': 'session=planted-sid'}):
+        assert session['theme'] == 'dark'
+        regenerate_session()
+        session['user_id'] = 5
+        response = app.response_class()
+        app.session_interface.save_session(app, session, response)
+        assert session.sid != 'planted-sid'
+        assert f"session={session.sid}" in response.headers['Set-Cookie']
+        assert backend.get(session.sid)[0] == {'theme': 'dark', 'user_id': 5}
+    assert backend.get('planted-sid') is None
@@ -0,0 +1,89 @@
+import pytest
+
+import app as app_module
+from app import MySQL, app, settle_transactions
+
+class SettlementDB:
+    """Just enough of MySQL for settle_transactions: transaction ids, their ages and the watermark"""
+    def __init__(self, ages):
+        self.ages = ages  # id -> seconds since the row was inserted
+        self.last_id = 0
+        self.commits = 0
+
+    def cursor(self):
+        return SettlementCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+class SettlementCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = None
+        self.rowcount = 0
+
+    def execute(self, query, params=()):
+        query = ' '.join(query.split())
+        ids = sorted(self.db.ages)
+        self.result = None
+        self.rowcount = 0
+        if query.startswith('SELECT last_id FROM settlement_watermark'):
+            self.result = (self.db.last_id,)
+        elif query.startswith('SELECT COALESCE( (SELECT MIN(id) - 1'):
+            last_id, lag = params
+            recent = [i for i in ids if i > last_id and self.db.ages[i] <= lag]
+            self.result = (min(recent) - 1 if recent else max(ids, default=None),)
+        elif query.startswith('SELECT MAX(id) FROM ('):
+            last_id, until_id, limit = params
+            batch = [i for i in ids if last_id < i <= until_id][:limit]
+            self.result = (max(batch, default=None),)
+        elif query.startswith('UPDATE settlement_watermark'):
+            self.db.last_id = params[0]
+
+    def fetchone(self):
+        return self.result
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def settle(monkeypatch):
+    batches = []
+
+    def run(ages, last_id=0, lag=60, batch_size=3):
+        db = SettlementDB(ages)
+        db.last_id = last_id
+        monkeypatch.setattr(MySQL, 'connection', property(lambda self: db), raising=False)
+        monkeypatch.setitem(app.config, 'SETTLEMENT_LAG', lag)
+        settled, _ = settle_transactions(batch_size=batch_size)
+        return settled, db.last_id
+
+    def settle_batch(cur, last_id, high_id):
+        batches.append((last_id, high_id))
+        return high_id - last_id
+    monkeypatch.setattr(app_module, 'settle_batch', settle_batch)
+    monkeypatch.setattr(app_module, 'flag_wallet_mismatches', lambda cur, last_id: 0)
+    run.batches = batches
+    return run
+
+def test_settles_everything_older_than_the_lag_in_batches(settle):
+    assert settle({i: 3600 for i in range(1, 9)}) == (8, 8)
+    assert settle.batches == [(0, 3), (3, 6), (6, 8)]
+
+def test_stops_before_the_first_recent_row(settle):
+    # Id 4 was handed out first but committed late; ids after it wait for the next run
+    ages = {1: 600, 2: 600, 3: 600, 4: 5, 5: 600, 6: 2}
+    assert settle(ages) == (3, 3)
+    assert settle.batches == [(0, 3)]
+
+def test_resumes_from_the_watermark(settle):
+    assert settle({i: 600 for i in range(1, 11)}, last_id=7) == (3, 10)
+    assert settle.batches == [(7, 10)]
+
+def test_nothing_new_leaves_the_watermark(settle):
+    assert settle({1: 600, 2: 600}, last_id=2) == (0, 2)
+    assert settle({}, last_id=0) == (0, 0)
+    assert settle.batches == []
@@ -0,0 +1,28 @@
+from datetime import date, datetime, time
+
+import pytest
+
+from app import app, next_trip_slot, parse_departures
+
+@pytest.fixture
+def departures(monkeypatch):
+    monkeypatch.setitem(app.config, 'TRIP_DEPARTURES', ['17:00', '07:30'])
+
+def test_next_trip_slot_same_day(departures):
+    assert next_trip_slot(datetime(2025, 3, 10, 6, 0)) == (date(2025, 3, 10), time(7, 30))
+    assert next_trip_slot(datetime(2025, 3, 10, 12, 0)) == (date(2025, 3, 10), time(17, 0))
+
+def test_next_trip_slot_skips_departure_that_has_left(departures):
+    assert next_trip_slot(datetime(2025, 3, 10, 7, 30)) == (date(2025, 3, 10), time(17, 0))
+
+def test_next_trip_slot_rolls_over_to_tomorrow(departures):
+    assert next_trip_slot(datetime(2025, 3, 10, 18, 0)) == (date(2025, 3, 11), time(7, 30))
+    assert next_trip_slot(datetime(2025, 12, 31, 23, 59)) == (date(2026, 1, 1), time(7, 30))
+
+@pytest.mark.parametrize('configured', [[], [''], ['5pm'], ['25:00', 'soon']])
+def test_next_trip_slot_falls_back_to_default_departure(monkeypatch, configured):
+    monkeypatch.setitem(app.config, 'TRIP_DEPARTURES', configured)
+    assert next_trip_slot(datetime(2025, 3, 10, 18, 0)) == (date(2025, 3, 11), time(17, 0))
+
+def test_invalid_departures_are_skipped():
+    assert parse_departures(['07:30', 'noon', ' 17:00 ', '07:30']) == [time(7, 30), time(17, 0)]